@@ -3,15 +3,41 @@ Index calculation engine with various weighting methods
 """
 import pandas as pd
 import numpy as np
-from typing import Dict, Any, List, Optional, Tuple
+from typing import Dict, Any, List, Optional, Tuple, Union
 from datetime import datetime, timedelta
 from abc import ABC, abstractmethod
+from dateutil.relativedelta import relativedelta
+import json
 import logging
 
 from app.db import models
 from app.processing.data_transformer import DataTransformer
 
 
+# Calendar period between rebalances for each IndexDefinition.rebalance_frequency
+_FREQ_DELTA = {
+    'daily': relativedelta(days=1),
+    'weekly': relativedelta(weeks=1),
+    'monthly': relativedelta(months=1),
+    'quarterly': relativedelta(months=3),
+    'annual': relativedelta(years=1)
+}
+
+
+def _as_array(values) -> np.ndarray:
+    """Coerce a sequence of numbers to a float64 array"""
+    return np.asarray(values, dtype=np.float64)
+
+
+def _backtest_kernel(prices: np.ndarray, weights: np.ndarray,
+                     base_value: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Index level and daily returns of a fixed-weight basket over a (days, assets) price matrix"""
+    basket = prices @ weights
+    index_values = base_value * basket / basket[0]
+    
+    return index_values, index_values[1:] / index_values[:-1] - 1
+
+
 class WeightingMethod(ABC):
     """Abstract base class for weighting methods"""
     
@@ -130,7 +156,7 @@ class ESGWeight(WeightingMethod):
 class IndexEngine:
     """Main index calculation engine"""
     
-    def __init__(self, db_session):
+    def __init__(self, db_session=None):
         self.db = db_session
         self.data_transformer = DataTransformer()
         self.logger = logging.getLogger(__name__)
@@ -144,6 +170,138 @@ class IndexEngine:
             'esg_weight': ESGWeight()
         }
     
+    def calculate_equal_weights(self, securities: List[Dict[str, Any]]) -> List[float]:
+        """Calculate equal weights for a list of securities"""
+        if not securities:
+            raise ValueError("No securities to weight")
+        
+        return np.full(len(securities), 1.0 / len(securities)).tolist()
+    
+    def calculate_market_cap_weights(self, securities: List[Dict[str, Any]]) -> List[float]:
+        """Calculate market cap weights for a list of securities"""
+        market_caps = self._security_values(securities, 'market_cap')
+        
+        # Market caps of securities quoted at a negative price cannot be trusted
+        negative = [
+            security.get('symbol') for security in securities
+            if security.get('price') is not None and security['price'] < 0
+        ]
+        if negative:
+            raise ValueError(f"Cannot weight securities with negative prices by market cap: {negative}")
+        
+        return self._normalize_weights(market_caps)
+    
+    def calculate_price_weights(self, securities: List[Dict[str, Any]]) -> List[float]:
+        """Calculate price weights for a list of securities"""
+        return self._normalize_weights(self._security_values(securities, 'price'))
+    
+    def calculate_esg_weights(self, securities: List[Dict[str, Any]]) -> List[float]:
+        """Calculate ESG score weights for a list of securities"""
+        return self._normalize_weights(self._security_values(securities, 'esg_score'))
+    
+    def select_constituents(self, securities: List[Dict[str, Any]],
+                            index_def: models.IndexDefinition) -> List[Dict[str, Any]]:
+        """Select the securities meeting the index definition's filters"""
+        return self._apply_filters(self._to_frame(securities), index_def).to_dict('records')
+    
+    def apply_esg_filters(self, securities: List[Dict[str, Any]],
+                          esg_criteria: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Keep the securities meeting the ESG criteria"""
+        df = self._to_frame(securities)
+        
+        if 'min_esg_score' in esg_criteria:
+            df = df[df['esg_score'] >= esg_criteria['min_esg_score']]
+        
+        return df.to_dict('records')
+    
+    def calculate_sector_allocation(self, securities: Union[Dict[str, List[Dict[str, Any]]],
+                                                            List[Dict[str, Any]]]) -> Dict[str, float]:
+        """Calculate each sector's share of total market cap"""
+        # Securities grouped by sector are flattened; a flat list carries its own sector field
+        if isinstance(securities, dict):
+            securities = [
+                {**security, 'sector': sector}
+                for sector, sector_securities in securities.items() for security in sector_securities
+            ]
+        
+        df = self._to_frame(securities)
+        
+        sector_caps = df.groupby('sector', observed=True, sort=False)['market_cap'].sum()
+        
+        return (sector_caps / sector_caps.sum()).to_dict()
+    
+    def calculate_volatility(self, returns: List[float], annualize: bool = True) -> float:
+        """Calculate (annualized) volatility of daily returns"""
+        volatility = _as_array(returns).std(ddof=1)
+        
+        return float(volatility * np.sqrt(252) if annualize else volatility)
+    
+    def calculate_sharpe_ratio(self, returns: List[float], risk_free_rate: float = 0.02) -> float:
+        """Calculate annualized Sharpe ratio of daily returns"""
+        returns = _as_array(returns)
+        
+        if len(returns) < 2:
+            return 0.0
+        
+        std = returns.std(ddof=1)
+        if std == 0:
+            return 0.0
+        
+        # De-annualize the risk-free rate by compounding, not by simple division
+        rf_daily = (1 + risk_free_rate) ** (1 / 252) - 1
+        
+        return float((returns.mean() - rf_daily) / std * np.sqrt(252))
+    
+    def calculate_max_drawdown(self, prices: List[float]) -> float:
+        """Calculate maximum peak-to-trough decline as a positive fraction"""
+        prices = _as_array(prices)
+        
+        if len(prices) == 0:
+            raise ValueError("No prices to calculate drawdown from")
+        
+        peaks = np.maximum.accumulate(prices)
+        
+        return float((1 - prices / peaks).max(initial=0.0))
+    
+    def calculate_correlation(self, returns_a: List[float], returns_b: List[float]) -> float:
+        """Calculate the correlation between two return series"""
+        returns_a, returns_b = _as_array(returns_a), _as_array(returns_b)
+        
+        if len(returns_a) != len(returns_b):
+            raise ValueError("Return series must have the same length")
+        
+        return float(np.corrcoef(returns_a, returns_b)[0, 1])
+    
+    def _to_frame(self, securities: List[Dict[str, Any]]) -> pd.DataFrame:
+        """Build the columnar view of a security list once"""
+        df = pd.DataFrame.from_records(securities)
+        
+        if 'sector' in df.columns:
+            df['sector'] = df['sector'].astype('category')
+        
+        return df
+    
+    def _security_values(self, securities: List[Dict[str, Any]], key: str) -> np.ndarray:
+        """Pull one numeric field of every security into a float array"""
+        if not securities:
+            raise ValueError("No securities to weight")
+        
+        values = np.fromiter((security[key] for security in securities), dtype=np.float64, count=len(securities))
+        
+        if np.any(values < 0):
+            raise ValueError(f"Negative {key} values are not allowed")
+        
+        return values
+    
+    def _normalize_weights(self, values: np.ndarray) -> List[float]:
+        """Scale values so they sum to one"""
+        total = values.sum()
+        
+        if total <= 0:
+            raise ValueError("Weights cannot be derived from values summing to zero")
+        
+        return (values / total).tolist()
+    
     def calculate_index(self, index_definition_id: int, date: datetime = None) -> Dict[str, Any]:
         """Calculate index value for a specific date"""
         if not date:
@@ -226,6 +384,18 @@ class IndexEngine:
             self.logger.error(f"Error calculating index series: {str(e)}")
             return pd.DataFrame()
     
+    def needs_rebalancing(self, index_def: models.IndexDefinition, last_rebalance: Optional[datetime],
+                          current_date: datetime) -> bool:
+        """Check whether a full rebalance period has passed since the last rebalance"""
+        if last_rebalance is None:
+            return True
+        
+        delta = _FREQ_DELTA.get(index_def.rebalance_frequency)
+        if delta is None:
+            raise ValueError(f"Unknown rebalance frequency: {index_def.rebalance_frequency}")
+        
+        return last_rebalance + delta <= current_date
+    
     def rebalance_index(self, index_definition_id: int, date: datetime = None) -> Dict[str, Any]:
         """Rebalance index constituents"""
         if not date:
@@ -300,6 +470,62 @@ class IndexEngine:
             self.logger.error(f"Error backtesting index: {str(e)}")
             return {"error": str(e)}
     
+    def run_backtest(self, index_definition: models.IndexDefinition,
+                     historical_data: Dict[Any, List[Dict[str, Any]]],
+                     start_date: Any, end_date: Any, base_value: float = 1000.0) -> Dict[str, Any]:
+        """Backtest an index definition over in-memory historical security data"""
+        history = {
+            date: securities for date, securities in sorted(historical_data.items())
+            if start_date <= date <= end_date
+        }
+        
+        if not history:
+            raise ValueError("No historical data in backtest range")
+        
+        # Stage prices as a (days, assets) matrix; assets must be priced on the first day
+        prices = pd.DataFrame.from_records([
+            {'date': date, 'symbol': security['symbol'], 'price': security['price']}
+            for date, securities in history.items() for security in securities
+        ]).pivot(index='date', columns='symbol', values='price').ffill().dropna(axis=1)
+        
+        first_day = [
+            security for security in next(iter(history.values()))
+            if security['symbol'] in prices.columns
+        ]
+        weights = self._backtest_weights(index_definition.weighting_method, first_day)
+        weights = pd.Series(weights, index=[security['symbol'] for security in first_day])
+        
+        index_values, daily_returns = _backtest_kernel(
+            prices.to_numpy(dtype=np.float64), weights.reindex(prices.columns).to_numpy(), base_value
+        )
+        
+        return {
+            "index_values": [
+                {"date": date, "index_value": float(value)}
+                for date, value in zip(prices.index, index_values)
+            ],
+            "performance_metrics": {
+                "total_return": float(index_values[-1] / index_values[0] - 1),
+                "volatility": self.calculate_volatility(daily_returns) if len(daily_returns) > 1 else 0.0,
+                "sharpe_ratio": self.calculate_sharpe_ratio(daily_returns),
+                "max_drawdown": self.calculate_max_drawdown(index_values)
+            },
+            "constituents_history": {
+                date: [security['symbol'] for security in securities]
+                for date, securities in history.items()
+            }
+        }
+    
+    def _backtest_weights(self, weighting_method: str, securities: List[Dict[str, Any]]) -> List[float]:
+        """Weights of the backtest basket, fixed at the first day"""
+        weight_functions = {
+            'market_cap_weight': self.calculate_market_cap_weights,
+            'price_weight': self.calculate_price_weights,
+            'esg_weight': self.calculate_esg_weights
+        }
+        
+        return weight_functions.get(weighting_method, self.calculate_equal_weights)(securities)
+    
     def _get_constituents(self, index_definition_id: int, date: datetime) -> pd.DataFrame:
         """Get index constituents for a specific date"""
         # Get the most recent constituents before or on the given date
@@ -364,33 +590,26 @@ class IndexEngine:
         return latest_constituents
     
     def _apply_filters(self, constituents: pd.DataFrame, index_def: models.IndexDefinition) -> pd.DataFrame:
-        """Apply index filters to constituents"""
-        filtered_df = constituents.copy()
+        """Apply index filters to constituents as one combined mask"""
+        mask = pd.Series(True, index=constituents.index)
         
         # Market cap filters
-        if index_def.min_market_cap:
-            filtered_df = filtered_df[filtered_df['market_cap'] >= index_def.min_market_cap]
-        
-        if index_def.max_market_cap:
-            filtered_df = filtered_df[filtered_df['market_cap'] <= index_def.max_market_cap]
+        if index_def.min_market_cap or index_def.max_market_cap:
+            mask &= constituents['market_cap'].between(
+                index_def.min_market_cap or -np.inf, index_def.max_market_cap or np.inf
+            )
         
         # Sector filter
-        if index_def.sectors:
-            try:
-                import json
-                allowed_sectors = json.loads(index_def.sectors)
-                filtered_df = filtered_df[filtered_df['sector'].isin(allowed_sectors)]
-            except:
-                pass
+        allowed_sectors = self._parse_list(index_def.sectors)
+        if allowed_sectors:
+            mask &= constituents['sector'].isin(allowed_sectors)
         
         # Country filter
-        if index_def.countries:
-            try:
-                import json
-                allowed_countries = json.loads(index_def.countries)
-                filtered_df = filtered_df[filtered_df['country'].isin(allowed_countries)]
-            except:
-                pass
+        allowed_countries = self._parse_list(index_def.countries)
+        if allowed_countries:
+            mask &= constituents['country'].isin(allowed_countries)
+        
+        filtered_df = constituents[mask]
         
         # Max constituents
         if index_def.max_constituents:
@@ -398,6 +617,28 @@ class IndexEngine:
         
         return filtered_df
     
+    def _parse_list(self, value: Any) -> Optional[List[Any]]:
+        """Read a filter list stored as a list, a JSON string, or a single value"""
+        if isinstance(value, (list, tuple)):
+            return list(value)
+        
+        if not isinstance(value, str) or not value.strip():
+            return None
+        
+        try:
+            parsed = json.loads(value)
+        except ValueError:
+            # A bare value such as Technology names a single entry
+            return [value.strip()]
+        
+        if parsed is None:
+            return None
+        if isinstance(parsed, dict):
+            raise ValueError(f"Filter must be a list of values, got: {value}")
+        
+        # A JSON scalar such as "Technology" or 5 is a one-entry list
+        return parsed if isinstance(parsed, list) else [parsed]
+    
     def _calculate_index_value(self, constituents: pd.DataFrame, weighting_method: str) -> float:
         """Calculate index value based on constituents and weighting method"""
         if constituents.empty:
@@ -461,22 +702,14 @@ class IndexEngine:
     
     def _calculate_sharpe_ratio(self, returns: pd.Series, risk_free_rate: float = 0.02) -> float:
         """Calculate Sharpe ratio"""
-        if len(returns) < 2:
-            return 0.0
-        
-        excess_returns = returns - (risk_free_rate / 252)
-        return (excess_returns.mean() / returns.std()) * np.sqrt(252) if returns.std() > 0 else 0.0
+        return self.calculate_sharpe_ratio(returns.dropna(), risk_free_rate)
     
     def _calculate_max_drawdown(self, values: pd.Series) -> float:
         """Calculate maximum drawdown"""
         if len(values) < 2:
             return 0.0
         
-        cumulative = (1 + values.pct_change()).cumprod()
-        running_max = cumulative.expanding().max()
-        drawdown = (cumulative - running_max) / running_max
-        
-        return drawdown.min()
+        return -self.calculate_max_drawdown(values.dropna())
     
     def _get_current_constituents(self, index_definition_id: int) -> pd.DataFrame:
         """Get current index constituents"""
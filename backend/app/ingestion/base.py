@@ -2,7 +2,7 @@
 Base classes for data ingestion
 """
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any, Optional, Union
+from typing import List, Dict, Any, Iterable, Optional, Union
 from datetime import datetime
 import pandas as pd
 from sqlalchemy.orm import Session
@@ -49,6 +49,11 @@ class SecurityIngestor(DataIngestor):
         # Clean column names
         data.columns = data.columns.str.lower().str.replace(' ', '_')
         
+        # Drop rows missing required fields and repeated symbols (first occurrence wins)
+        data = data.dropna(subset=[col for col in ('symbol', 'name') if col in data.columns])
+        if 'symbol' in data.columns:
+            data = data.drop_duplicates(subset='symbol', keep='first')
+        
         # Handle missing values
         data = data.fillna('')
         
@@ -172,6 +177,76 @@ class PriceDataIngestor(DataIngestor):
             "created": created_count,
             "errors": errors
         }
+    
+    def ingest_chunks(self, chunks: Iterable[pd.DataFrame]) -> Dict[str, Any]:
+        """Ingest price data chunk by chunk with one bulk insert per chunk"""
+        from app.db import models
+        
+        created_count = 0
+        errors = []
+        security_ids: Dict[str, Optional[int]] = {}
+        
+        for chunk in chunks:
+            transformed_data = self.transform(chunk)
+            if 'symbol' not in transformed_data.columns:
+                errors.append("No security_id or symbol provided")
+                continue
+            
+            # Resolve symbols not seen in earlier chunks with a single query
+            new_symbols = set(transformed_data['symbol'].unique()) - security_ids.keys()
+            if new_symbols:
+                security_ids.update(dict.fromkeys(new_symbols))
+                security_ids.update(
+                    self.db.query(models.Security.symbol, models.Security.id).filter(
+                        models.Security.symbol.in_(new_symbols)
+                    ).all()
+                )
+            
+            # Load the (security_id, date) pairs already stored for this chunk's range
+            chunk_security_ids = {
+                security_ids[symbol] for symbol in transformed_data['symbol'].unique()
+                if security_ids[symbol] is not None
+            }
+            existing = set()
+            if chunk_security_ids:
+                existing.update(
+                    self.db.query(models.PriceData.security_id, models.PriceData.date).filter(
+                        models.PriceData.security_id.in_(chunk_security_ids),
+                        models.PriceData.date.between(
+                            transformed_data['date'].min(), transformed_data['date'].max()
+                        )
+                    ).all()
+                )
+            
+            mappings = []
+            for row in transformed_data.to_dict('records'):
+                security_id = security_ids[row['symbol']]
+                if security_id is None:
+                    errors.append(f"Security not found: {row['symbol']}")
+                    continue
+                
+                try:
+                    row['security_id'] = security_id
+                    price_data = PriceDataCreate(**row).dict()
+                except Exception as e:
+                    errors.append(f"Error processing price data for date {row.get('date', 'unknown')}: {str(e)}")
+                    continue
+                
+                key = (security_id, price_data['date'])
+                if key not in existing:
+                    existing.add(key)
+                    mappings.append(price_data)
+            
+            if mappings:
+                self.db.bulk_insert_mappings(models.PriceData, mappings)
+                created_count += len(mappings)
+        
+        self.db.commit()
+        
+        return {
+            "created": created_count,
+            "errors": errors
+        }
 
 
 class DataIngestionManager:
@@ -190,6 +265,10 @@ class DataIngestionManager:
         """Ingest price data"""
         return self.price_ingestor.ingest(data, security_id)
     
+    def ingest_price_chunks(self, chunks: Iterable[pd.DataFrame]) -> Dict[str, Any]:
+        """Ingest price data from an iterable of DataFrame chunks"""
+        return self.price_ingestor.ingest_chunks(chunks)
+    
     def bulk_ingest(self, securities_data: pd.DataFrame, prices_data: Dict[str, pd.DataFrame]) -> Dict[str, Any]:
         """Bulk ingest securities and their price data"""
         results = {
@@ -1,11 +1,14 @@
 """
 CSV data ingestion
 """
+import csv
 import pandas as pd
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Iterator, Optional, List
+from itertools import chain, islice
 from pathlib import Path
 import logging
 
+from app.core.config import settings
 from app.ingestion.base import DataSource, DataIngestionManager
 from app.db import schemas
 
@@ -35,6 +38,22 @@ class CSVDataSource(DataSource):
         except Exception as e:
             raise Exception(f"Error reading CSV file {self.file_path}: {str(e)}")
     
+    def extract_chunks(self, chunksize: int = settings.BATCH_SIZE) -> Iterator[pd.DataFrame]:
+        """Extract data from CSV file in chunks of ``chunksize`` rows"""
+        return pd.read_csv(
+            self.file_path, encoding=self.encoding, sep=self._detect_separator(), chunksize=chunksize
+        )
+    
+    def _detect_separator(self) -> str:
+        """Detect the separator from the first lines, respecting quoted fields"""
+        with open(self.file_path, encoding=self.encoding, newline='') as f:
+            sample = ''.join(islice(f, 5))
+        
+        try:
+            return csv.Sniffer().sniff(sample, delimiters=',;\t').delimiter
+        except csv.Error:
+            raise ValueError(f"Could not parse CSV file: {self.file_path}")
+    
     def validate(self, data: pd.DataFrame) -> bool:
         """Validate CSV data"""
         if data.empty:
@@ -97,17 +116,18 @@ class CSVIngestor:
         csv_path = file_path or self.file_path
         
         try:
-            # Extract data
-            data = self.data_source.extract()
-            
-            # Validate data
-            self.data_source.validate(data)
-            
-            # Determine if this is price data
-            if 'symbol' in data.columns and 'date' in data.columns and 'close_price' in data.columns:
-                return self.ingestion_manager.ingest_prices(data)
-            else:
-                return {"error": "CSV does not contain price data"}
+            # Extract data in chunks so memory is bounded by the batch size
+            with self.data_source.extract_chunks() as chunks:
+                first_chunk = next(chunks, pd.DataFrame())
+                
+                # Validate data
+                self.data_source.validate(first_chunk)
+                
+                # Determine if this is price data
+                if 'symbol' in first_chunk.columns and 'date' in first_chunk.columns and 'close_price' in first_chunk.columns:
+                    return self.ingestion_manager.ingest_price_chunks(chain([first_chunk], chunks))
+                else:
+                    return {"error": "CSV does not contain price data"}
                 
         except Exception as e:
             self.logger.error(f"Error ingesting prices from CSV: {str(e)}")
@@ -3,9 +3,58 @@ Data cleaning and preprocessing
 """
 import pandas as pd
 import numpy as np
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Callable, List, Optional, Tuple, Union
 from datetime import datetime
+from functools import lru_cache
+import ast
 import logging
+import numbers
+
+
+# Record lists longer than this are deduplicated and validated through pandas
+PANDAS_THRESHOLD = 1000
+
+# Predicate template for _compile_validator; the return value is replaced by the rule checks
+_VALIDATOR_TEMPLATE = """
+def validator(record):
+    try:
+        return True
+    except (KeyError, TypeError):
+        return False
+"""
+
+
+def _is_number(value: Any) -> bool:
+    """Range rules only accept real numbers; strings and bools fail them on every path"""
+    return isinstance(value, numbers.Real) and not isinstance(value, (bool, np.bool_))
+
+
+# Static reference rates: USD value of one unit of each currency
+USD_EXCHANGE_RATES = {
+    'USD': 1.0,
+    'EUR': 1.08,
+    'GBP': 1.27,
+    'JPY': 0.0067,
+    'CHF': 1.12,
+    'CAD': 0.74,
+    'AUD': 0.66
+}
+
+# Columns holding amounts in the record's currency
+MONETARY_COLUMNS = ['price', 'market_cap']
+
+# Record quality checks: text columns must be non-blank, amount columns positive
+QUALITY_TEXT_COLUMNS = ['symbol', 'name']
+QUALITY_POSITIVE_COLUMNS = ['price', 'market_cap']
+
+
+@lru_cache(maxsize=1024)
+def _exchange_rate(from_currency: str, to_currency: str) -> float:
+    """Rate lookup shared by all cleaners, cached per currency pair"""
+    try:
+        return USD_EXCHANGE_RATES[from_currency] / USD_EXCHANGE_RATES[to_currency]
+    except KeyError as e:
+        raise ValueError(f"Unknown currency: {e.args[0]}")
 
 
 class DataCleaner:
@@ -20,6 +69,7 @@ class DataCleaner:
         
         # Remove duplicates
         df = df.drop_duplicates(subset=['security_id', 'date'], keep='last')
+        df = self._shrink(df)
         
         # Remove rows with missing close price
         df = df.dropna(subset=['close_price'])
@@ -47,6 +97,7 @@ class DataCleaner:
         
         # Remove duplicates
         df = df.drop_duplicates(subset=['symbol'], keep='last')
+        df = self._shrink(df)
         
         # Remove rows with missing symbol or name
         df = df.dropna(subset=['symbol', 'name'])
@@ -68,6 +119,22 @@ class DataCleaner:
         
         return df
     
+    def _shrink(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Downcast numeric columns to the smallest dtype that holds their values exactly"""
+        df = df.copy()
+        
+        for column in df.select_dtypes(include='number').columns:
+            if pd.api.types.is_float_dtype(df[column]):
+                # to_numeric may round to float32, so only keep the downcast if it round-trips
+                downcast = pd.to_numeric(df[column], downcast='float')
+                if downcast.astype(np.float64).equals(df[column].astype(np.float64)):
+                    df[column] = downcast
+            else:
+                # Signed only, so differences of unsigned columns cannot wrap around
+                df[column] = pd.to_numeric(df[column], downcast='integer')
+        
+        return df
+    
     def _remove_price_outliers(self, df: pd.DataFrame) -> pd.DataFrame:
         """Remove extreme price outliers"""
         # Calculate daily returns
@@ -153,6 +220,84 @@ class DataCleaner:
         
         return df_deduplicated
     
+    def remove_duplicates(self, data: List[Dict[str, Any]],
+                          key: Union[str, Tuple[str, ...]] = 'symbol') -> List[Dict[str, Any]]:
+        """Remove duplicate records by key (or tuple of keys), keeping the first occurrence"""
+        keys = (key,) if isinstance(key, str) else tuple(key)
+        
+        if len(data) > PANDAS_THRESHOLD:
+            # Large inputs are deduplicated in pandas' hash table; only the key columns go through
+            # the frame so the original records are returned untouched, and missing keys raise
+            key_frame = pd.DataFrame({k: [record[k] for record in data] for k in keys})
+            deduplicated = [data[i] for i in np.flatnonzero(~key_frame.duplicated().to_numpy())]
+        else:
+            seen: Dict[Tuple[Any, ...], Dict[str, Any]] = {}
+            for record in data:
+                seen.setdefault(tuple(record[k] for k in keys), record)
+            deduplicated = list(seen.values())
+        
+        self.logger.info(f"Removed duplicates by {key}: {len(data)} -> {len(deduplicated)} records")
+        
+        return deduplicated
+    
+    def get_exchange_rate(self, from_currency: str, to_currency: str) -> float:
+        """Get the rate converting one unit of from_currency into to_currency"""
+        return _exchange_rate(from_currency, to_currency)
+    
+    def harmonize_currencies(self, data: Union[List[Dict[str, Any]], pd.DataFrame],
+                             target_currency: str = 'USD') -> Union[List[Dict[str, Any]], pd.DataFrame]:
+        """Convert monetary columns to the target currency"""
+        if not isinstance(data, pd.DataFrame):
+            return self._harmonize_records(data, target_currency)
+        
+        # Batches already in the target currency are returned unchanged
+        if 'currency' in data.columns and data['currency'].eq(target_currency).all():
+            return data
+        
+        if data.empty or 'currency' not in data.columns:
+            return data
+        
+        df = data.copy()
+        
+        # One rate lookup per distinct currency; rows without a currency are left unchanged
+        rates = pd.Series({
+            currency: 1.0 if currency == target_currency else self.get_exchange_rate(currency, target_currency)
+            for currency in df['currency'].dropna().unique()
+        }, dtype=float)
+        factors = df['currency'].map(rates).astype(float).fillna(1.0)
+        
+        for column in MONETARY_COLUMNS:
+            if column in df.columns:
+                df[column] *= factors
+        
+        df['currency'] = pd.Categorical([target_currency] * len(df))
+        
+        return df
+    
+    def _harmonize_records(self, data: List[Dict[str, Any]], target_currency: str) -> List[Dict[str, Any]]:
+        """Convert record amounts, touching only the monetary fields and the currency"""
+        rates: Dict[str, float] = {}
+        harmonized = []
+        
+        for record in data:
+            currency = record.get('currency')
+            
+            # Records without a currency, or already in the target one, are kept as they are
+            if currency is None or currency == target_currency:
+                harmonized.append(record)
+                continue
+            
+            if currency not in rates:
+                rates[currency] = self.get_exchange_rate(currency, target_currency)
+            
+            record = {**record, 'currency': target_currency}
+            for column in MONETARY_COLUMNS:
+                if record.get(column) is not None:
+                    record[column] = record[column] * rates[currency]
+            harmonized.append(record)
+        
+        return harmonized
+    
     def normalize_timezone(self, df: pd.DataFrame, date_column: str = 'date', timezone: str = 'UTC') -> pd.DataFrame:
         """Normalize timezone for date columns"""
         if date_column in df.columns:
@@ -163,8 +308,76 @@ class DataCleaner:
         
         return df
     
-    def validate_data_quality(self, df: pd.DataFrame, data_type: str) -> Dict[str, Any]:
-        """Validate data quality and return quality metrics"""
+    def normalize_timezones(self, data: List[Dict[str, Any]], target_timezone: str = 'UTC',
+                            date_field: str = 'date') -> List[Dict[str, Any]]:
+        """Convert record timestamps to ISO 8601 strings in the target timezone"""
+        dates = pd.to_datetime(
+            pd.Series([record.get(date_field) for record in data], dtype=object), utc=True, format='ISO8601'
+        )
+        formatted = (
+            dates.dt.tz_convert(target_timezone)
+            .dt.strftime('%Y-%m-%dT%H:%M:%S%z')
+            .str.replace(r'(\d{2})(\d{2})$', r'\1:\2', regex=True)  # +0000 -> +00:00
+        )
+        
+        return [
+            {**record, date_field: date} if isinstance(date, str) else record
+            for record, date in zip(data, formatted)
+        ]
+    
+    def validate_numeric_ranges(self, data: List[Dict[str, Any]],
+                                rules: Dict[str, Dict[str, float]]) -> List[Dict[str, Any]]:
+        """Keep records whose columns fall within the rule's min/max bounds"""
+        if len(data) <= PANDAS_THRESHOLD:
+            rules_key = tuple((column, bounds.get('min'), bounds.get('max')) for column, bounds in rules.items())
+            valid_data = list(filter(self._compile_validator(rules_key), data))
+            self.logger.info(f"Validated numeric ranges: {len(data)} -> {len(valid_data)} records")
+            return valid_data
+        
+        mask = np.ones(len(data), dtype=bool)
+        
+        for column, bounds in rules.items():
+            # Missing and non-numeric values fail every bound
+            values = pd.Series([record.get(column) for record in data], dtype=object)
+            values = values.where(values.map(_is_number)).astype(float)
+            if 'min' in bounds:
+                mask &= (values >= bounds['min']).to_numpy()
+            if 'max' in bounds:
+                mask &= (values <= bounds['max']).to_numpy()
+        
+        self.logger.info(f"Validated numeric ranges: {len(data)} -> {int(mask.sum())} records")
+        
+        return [record for record, valid in zip(data, mask) if valid]
+    
+    @staticmethod
+    @lru_cache(maxsize=128)
+    def _compile_validator(rules_key: Tuple[Tuple[str, Optional[float], Optional[float]], ...]
+                           ) -> Callable[[Dict[str, Any]], bool]:
+        """Build a predicate with the rule bounds inlined as constants, cached per rule set"""
+        checks = []
+        for column, minimum, maximum in rules_key:
+            value = ast.Subscript(value=ast.Name(id='record', ctx=ast.Load()), slice=ast.Constant(column), ctx=ast.Load())
+            checks.append(ast.Call(func=ast.Name(id='_is_number', ctx=ast.Load()), args=[value], keywords=[]))
+            if minimum is not None:
+                checks.append(ast.Compare(left=ast.Constant(minimum), ops=[ast.LtE()], comparators=[value]))
+            if maximum is not None:
+                checks.append(ast.Compare(left=value, ops=[ast.LtE()], comparators=[ast.Constant(maximum)]))
+        
+        module = ast.parse(_VALIDATOR_TEMPLATE)
+        if checks:
+            # Missing keys raise inside the try and fail validation
+            module.body[0].body[0].body[0].value = checks[0] if len(checks) == 1 else ast.BoolOp(op=ast.And(), values=checks)
+        
+        namespace: Dict[str, Any] = {'_is_number': _is_number}
+        exec(compile(ast.fix_missing_locations(module), '<validator>', 'exec'), namespace)
+        return namespace['validator']
+    
+    def validate_data_quality(self, df: Union[pd.DataFrame, List[Dict[str, Any]]],
+                              data_type: Optional[str] = None) -> Union[Dict[str, Any], float]:
+        """Validate data quality and return quality metrics, or a 0-100 score for records"""
+        if not isinstance(df, pd.DataFrame):
+            return self._quality_score(df)
+        
         quality_metrics = {
             'total_rows': len(df),
             'null_counts': df.isnull().sum().to_dict(),
@@ -188,3 +401,22 @@ class DataCleaner:
                 quality_metrics['duplicate_symbols'] = df['symbol'].duplicated().sum()
         
         return quality_metrics
+    
+    def _quality_score(self, data: List[Dict[str, Any]]) -> float:
+        """Percentage of records passing every text and positive-amount check"""
+        df = pd.DataFrame.from_records(data)
+        if df.empty:
+            return 100.0
+        
+        invalid = np.zeros(len(df), dtype=bool)
+        
+        for column in QUALITY_TEXT_COLUMNS:
+            if column in df.columns:
+                invalid |= df[column].fillna('').astype(str).str.strip().eq('').to_numpy()
+        
+        for column in QUALITY_POSITIVE_COLUMNS:
+            if column in df.columns:
+                # Non-numeric amounts become NaN and fail the comparison
+                invalid |= ~(pd.to_numeric(df[column], errors='coerce') > 0).to_numpy()
+        
+        return float(100.0 * (1 - invalid.mean()))
@@ -3,11 +3,45 @@ Data transformation utilities
 """
 import pandas as pd
 import numpy as np
-from typing import Dict, Any, List, Optional, Tuple
+from typing import Dict, Any, List, Optional, Sequence, Tuple, Union
 from datetime import datetime, timedelta
 import logging
 
 
+# pandas resample rules for aggregate_data_by_timeframe; periods are labelled by their end date
+TIMEFRAME_RULES = {
+    'daily': 'D',
+    'weekly': 'W',
+    'monthly': 'ME'
+}
+
+
+def _volatility(returns: np.ndarray) -> float:
+    """Sample standard deviation of a return array"""
+    return float(np.std(returns, ddof=1))
+
+
+def _beta(stock: np.ndarray, market: np.ndarray) -> float:
+    """Covariance over market variance from one pass over the demeaned arrays"""
+    stock = stock - stock.mean()
+    market = market - market.mean()
+    
+    return float(stock @ market / (market @ market))
+
+
+def _rsi(prices: np.ndarray, period: int) -> float:
+    """Latest RSI; Wilder's exponential averages reduce to one weighted dot product each"""
+    delta = np.diff(prices)
+    weights = (1 - 1 / period) ** np.arange(len(delta) - 1, -1, -1)
+    gain = weights @ np.maximum(delta, 0.0)
+    loss = weights @ np.maximum(-delta, 0.0)
+    
+    if loss == 0:
+        return 100.0
+    
+    return float(100 - (100 / (1 + gain / loss)))
+
+
 class DataTransformer:
     """Data transformation utilities"""
     
@@ -29,9 +63,13 @@ class DataTransformer:
         
         return df_sorted
     
-    def calculate_volatility(self, df: pd.DataFrame, return_column: str = 'daily_return', 
-                           window: int = 20, annualize: bool = True) -> pd.DataFrame:
-        """Calculate rolling volatility"""
+    def calculate_volatility(self, df: Union[pd.DataFrame, Sequence[float]], return_column: str = 'daily_return', 
+                           window: int = 20, annualize: bool = True) -> Union[pd.DataFrame, float]:
+        """Calculate rolling volatility, or the volatility of a return series"""
+        if not isinstance(df, pd.DataFrame):
+            volatility = _volatility(np.asarray(df, dtype=np.float64))
+            return volatility * np.sqrt(252) if annualize else volatility
+        
         df_sorted = df.sort_values(['security_id', 'date'])
         
         # Calculate rolling standard deviation
@@ -45,6 +83,65 @@ class DataTransformer:
         
         return df_sorted
     
+    def calculate_beta(self, stock_returns: Sequence[float], market_returns: Sequence[float]) -> float:
+        """Calculate beta of a return series against the market"""
+        return _beta(np.asarray(stock_returns, dtype=np.float64), np.asarray(market_returns, dtype=np.float64))
+    
+    def calculate_simple_moving_average(self, prices: Sequence[float], period: int = 20) -> float:
+        """Calculate the latest simple moving average"""
+        prices = self._require_prices(prices, period)
+        
+        return float(np.convolve(prices, np.ones(period) / period, 'valid')[-1])
+    
+    def calculate_exponential_moving_average(self, prices: Sequence[float], period: int = 20) -> float:
+        """Calculate the latest exponential moving average"""
+        prices = self._require_prices(prices, period)
+        
+        return float(pd.Series(prices).ewm(span=period, adjust=False).mean().iloc[-1])
+    
+    def calculate_bollinger_bands(self, prices: Sequence[float], period: int = 20,
+                                  std_dev: float = 2) -> Dict[str, float]:
+        """Calculate the latest Bollinger Bands"""
+        window = self._require_prices(prices, period)[-period:]
+        
+        # Mean and deviation are both reduced from the same window
+        middle = window.mean()
+        spread = std_dev * window.std()
+        
+        return {
+            'upper_band': float(middle + spread),
+            'middle_band': float(middle),
+            'lower_band': float(middle - spread)
+        }
+    
+    def calculate_macd(self, prices: Sequence[float], fast_period: int = 12, slow_period: int = 26,
+                       signal_period: int = 9) -> Dict[str, float]:
+        """Calculate the latest MACD line, signal line and histogram"""
+        prices = pd.Series(self._require_prices(prices, 1))
+        
+        # Both EMAs read the same float64 buffer
+        macd = prices.ewm(span=fast_period, adjust=False).mean() - prices.ewm(span=slow_period, adjust=False).mean()
+        signal = macd.ewm(span=signal_period, adjust=False).mean()
+        
+        return {
+            'macd_line': float(macd.iloc[-1]),
+            'signal_line': float(signal.iloc[-1]),
+            'histogram': float(macd.iloc[-1] - signal.iloc[-1])
+        }
+    
+    def calculate_rsi(self, prices: Sequence[float], period: int = 14) -> float:
+        """Calculate the latest Relative Strength Index with Wilder smoothing"""
+        return _rsi(self._require_prices(prices, period + 1), period)
+    
+    def _require_prices(self, prices: Sequence[float], count: int) -> np.ndarray:
+        """Convert prices to a float array holding at least count values"""
+        prices = np.asarray(prices, dtype=np.float64)
+        
+        if len(prices) < count:
+            raise ValueError(f"At least {count} prices are required, got {len(prices)}")
+        
+        return prices
+    
     def calculate_technical_indicators(self, df: pd.DataFrame) -> pd.DataFrame:
         """Calculate technical indicators"""
         df_sorted = df.sort_values(['security_id', 'date'])
@@ -93,8 +190,12 @@ class DataTransformer:
         
         return df
     
-    def calculate_performance_metrics(self, df: pd.DataFrame) -> pd.DataFrame:
+    def calculate_performance_metrics(self, df: Union[pd.DataFrame, List[Dict[str, Any]]]
+                                      ) -> Union[pd.DataFrame, List[Dict[str, Any]]]:
         """Calculate performance metrics"""
+        if not isinstance(df, pd.DataFrame):
+            return self._record_performance_metrics(df)
+        
         df_sorted = df.sort_values(['security_id', 'date'])
         
         for security_id in df_sorted['security_id'].unique():
@@ -133,6 +234,29 @@ class DataTransformer:
         
         return df_sorted
     
+    def _record_performance_metrics(self, data: List[Dict[str, Any]], window: int = 20) -> List[Dict[str, Any]]:
+        """Attach per-symbol daily returns and rolling volatility to price records, keeping their order"""
+        if not data:
+            return []
+        
+        df = pd.DataFrame.from_records(data)
+        
+        # Returns run in date order within each symbol; records without a symbol form one series
+        ordered = df.sort_values('date', kind='stable') if 'date' in df.columns else df
+        series = ordered['symbol'] if 'symbol' in ordered.columns else pd.Series(0, index=ordered.index)
+        
+        daily_return = ordered.groupby(series, sort=False, dropna=False)['price'].pct_change()
+        df['daily_return'] = daily_return
+        df['volatility'] = daily_return.groupby(series, sort=False, dropna=False).transform(
+            lambda returns: returns.rolling(window, min_periods=2).std()
+        )
+        
+        # Metrics that are undefined for a record (e.g. the first return) are left out rather than NaN
+        return [
+            {key: value for key, value in record.items() if key not in ('daily_return', 'volatility') or pd.notna(value)}
+            for record in df.to_dict('records')
+        ]
+    
     def resample_data(self, df: pd.DataFrame, frequency: str = 'M') -> pd.DataFrame:
         """Resample data to different frequencies"""
         df_sorted = df.sort_values(['security_id', 'date'])
@@ -163,6 +287,44 @@ class DataTransformer:
         else:
             return pd.DataFrame()
     
+    def aggregate_data_by_timeframe(self, data: List[Dict[str, Any]],
+                                    timeframe: str = 'weekly') -> List[Dict[str, Any]]:
+        """Aggregate daily price/volume records to a coarser timeframe"""
+        if timeframe not in TIMEFRAME_RULES:
+            raise ValueError(f"Unknown timeframe: {timeframe}")
+        
+        df = pd.DataFrame.from_records(data)
+        if df.empty:
+            return []
+        
+        resampler = df.assign(date=pd.to_datetime(df['date'])).set_index('date').resample(TIMEFRAME_RULES[timeframe])
+        aggregations = {column: agg for column, agg in [('price', 'mean'), ('volume', 'sum')] if column in df.columns}
+        
+        # Drop the empty periods resample creates for gaps in the data
+        aggregated = resampler.agg(aggregations)[resampler.size() > 0].reset_index()
+        aggregated['date'] = aggregated['date'].dt.strftime('%Y-%m-%d')
+        
+        return aggregated.to_dict('records')
+    
+    def calculate_sector_performance(self, sector_data: Union[pd.DataFrame, Dict[str, List[Dict[str, Any]]]]
+                                     ) -> Dict[str, Dict[str, float]]:
+        """Calculate average return, dispersion and member count per sector"""
+        if isinstance(sector_data, pd.DataFrame):
+            df = sector_data
+        else:
+            df = pd.DataFrame.from_records(
+                [{'sector': sector, **record} for sector, records in sector_data.items() for record in records]
+            )
+        
+        if df.empty:
+            return {}
+        
+        performance = df.astype({'sector': 'category'}).groupby('sector', observed=True)['return'].agg(
+            ['mean', 'std', 'count']
+        )
+        
+        return performance.rename(columns={'mean': 'average_return', 'std': 'return_std'}).to_dict('index')
+    
     def calculate_index_constituents(self, df: pd.DataFrame, date: datetime, 
                                    filters: Dict[str, Any]) -> pd.DataFrame:
         """Calculate index constituents based on filters"""
@@ -2,20 +2,40 @@
 ETL/ELT Pipeline for data processing
 """
 import pandas as pd
-from typing import Dict, Any, List, Optional
+import polars as pl
+from typing import Dict, Any, Iterable, List, Optional, Set, Union
+from dataclasses import dataclass, asdict
 from datetime import datetime
+from itertools import islice
 import logging
 from sqlalchemy.orm import Session
 
-from app.processing.data_cleaner import DataCleaner
+from app.core.config import settings
+from app.processing.data_cleaner import DataCleaner, MONETARY_COLUMNS
 from app.processing.data_transformer import DataTransformer
 from app.db import models
 
 
+# Record batches larger than this run through Polars instead of the record loop
+POLARS_THRESHOLD = 256
+
+
+@dataclass(slots=True)
+class SecurityRow:
+    """Compact security record accepted by the pipeline alongside plain dicts"""
+    symbol: str
+    name: str
+    price: float
+    currency: str
+    date: str
+    volume: int
+    shares_outstanding: Optional[int] = None
+
+
 class ETLPipeline:
     """ETL Pipeline for processing financial data"""
     
-    def __init__(self, db: Session):
+    def __init__(self, db: Optional[Session] = None):
         self.db = db
         self.data_cleaner = DataCleaner()
         self.data_transformer = DataTransformer()
@@ -198,6 +218,160 @@ class ETLPipeline:
         
         return results
     
+    def run_pipeline(self, raw_data: List[Union[Dict[str, Any], SecurityRow]], validate: bool = False,
+                     strict: bool = False, target_currency: str = 'USD') -> List[Dict[str, Any]]:
+        """Run in-memory records through dedupe, validation, currency harmonization and transformation"""
+        if len(raw_data) > POLARS_THRESHOLD:
+            try:
+                return self._run_polars(raw_data, validate, strict, target_currency)
+            except ValueError:
+                raise
+            except Exception as e:
+                self.logger.warning(f"Falling back to record pipeline: {str(e)}")
+        
+        return self._process_records(raw_data, set(), validate, strict, target_currency)
+    
+    def run_pipeline_stream(self, records: Iterable[Union[Dict[str, Any], SecurityRow]], chunk_size: int = settings.BATCH_SIZE,
+                            validate: bool = False, strict: bool = False,
+                            target_currency: str = 'USD') -> Dict[str, Any]:
+        """Run records through the pipeline chunk by chunk, keeping only counts"""
+        records = iter(records)
+        seen_symbols: Set[Any] = set()  # Shared so duplicates are caught across chunks
+        processed_rows = 0
+        chunks = 0
+        
+        while True:
+            chunk = list(islice(records, chunk_size))
+            if not chunk:
+                break
+            
+            processed_rows += len(self._process_records(chunk, seen_symbols, validate, strict, target_currency))
+            chunks += 1
+        
+        return {
+            "processed_rows": processed_rows,
+            "chunks": chunks,
+            "status": "success"
+        }
+    
+    def _process_records(self, records: List[Union[Dict[str, Any], SecurityRow]], seen_symbols: Set[Any],
+                         validate: bool, strict: bool, target_currency: str) -> List[Dict[str, Any]]:
+        """Dedupe, validate, harmonize and transform one batch of records in a single pass"""
+        processed_at = datetime.now().isoformat()
+        rates: Dict[Any, float] = {None: 1.0, target_currency: 1.0}
+        processed = []
+        
+        for record in records:
+            if isinstance(record, SecurityRow):
+                record = asdict(record)
+            
+            symbol = record.get('symbol')
+            
+            if symbol is None:
+                if strict:
+                    raise ValueError(f"Record without symbol: {record}")
+                self.logger.warning(f"Skipping record without symbol: {record}")
+                continue
+            
+            if symbol in seen_symbols:
+                continue
+            seen_symbols.add(symbol)
+            
+            if validate and not self._is_valid_record(record):
+                continue
+            
+            # Records without a currency are left unconverted
+            currency = record.get('currency')
+            if currency not in rates:
+                rates[currency] = self.data_cleaner.get_exchange_rate(currency, target_currency)
+            
+            processed.append(self._transform_record(record, rates[currency], target_currency, processed_at))
+        
+        return processed
+    
+    def _run_polars(self, raw_data: List[Union[Dict[str, Any], SecurityRow]], validate: bool, strict: bool,
+                    target_currency: str) -> List[Dict[str, Any]]:
+        """Pick the rows to keep and their rates in Polars, then transform the original records"""
+        records = [asdict(record) if isinstance(record, SecurityRow) else record for record in raw_data]
+        df = pl.DataFrame({
+            '_row': range(len(records)),
+            'symbol': self._polars_column(records, 'symbol', str, pl.Utf8),
+            'name': self._polars_column(records, 'name', str, pl.Utf8),
+            'price': self._polars_column(records, 'price', (int, float), pl.Float64),
+            'volume': self._polars_column(records, 'volume', (int, float), pl.Float64),
+            'currency': self._polars_column(records, 'currency', str, pl.Utf8)
+        })
+        
+        missing_symbol = df['symbol'].null_count()
+        if missing_symbol:
+            if strict:
+                first = df.filter(pl.col('symbol').is_null())['_row'][0]
+                raise ValueError(f"Record without symbol: {records[first]}")
+            self.logger.warning(f"Skipping {missing_symbol} records without symbol")
+            df = df.filter(pl.col('symbol').is_not_null())
+            if df.is_empty():
+                return []
+        
+        df = df.unique(subset='symbol', keep='first', maintain_order=True)
+        
+        if validate:
+            df = df.filter(
+                pl.col('name').is_not_null() & (pl.col('name') != '')
+                & (pl.col('price').is_null() | (pl.col('price') > 0))
+                & (pl.col('volume').is_null() | (pl.col('volume') >= 0))
+            )
+        
+        # Rows without a currency are left unconverted, as in the record loop
+        rates: Dict[Any, float] = {None: 1.0, target_currency: 1.0}
+        for currency in df['currency'].drop_nulls().unique():
+            if currency not in rates:
+                rates[currency] = self.data_cleaner.get_exchange_rate(currency, target_currency)
+        
+        processed_at = datetime.now().isoformat()
+        return [
+            self._transform_record(records[row], rates[currency], target_currency, processed_at)
+            for row, currency in df.select('_row', 'currency').iter_rows()
+        ]
+    
+    def _polars_column(self, records: List[Dict[str, Any]], key: str, types: Any, dtype: Any) -> pl.Series:
+        """Build a typed column, refusing values Polars would silently turn into nulls"""
+        values = [record.get(key) for record in records]
+        for value in values:
+            if value is not None and not isinstance(value, types):
+                raise TypeError(f"Unexpected {key} value for Polars: {value!r}")
+        return pl.Series(key, values, dtype=dtype)
+    
+    def _is_valid_record(self, record: Dict[str, Any]) -> bool:
+        """Check a record has a name, a positive price and a non-negative volume"""
+        if not record.get('name'):
+            return False
+        
+        if record.get('price') is not None and record['price'] <= 0:
+            return False
+        
+        if record.get('volume') is not None and record['volume'] < 0:
+            return False
+        
+        return True
+    
+    def _transform_record(self, record: Dict[str, Any], rate: float, target_currency: str,
+                          processed_at: str) -> Dict[str, Any]:
+        """Convert amounts to the target currency, derive market cap and stamp processing time"""
+        record = dict(record)
+        
+        if rate != 1.0:
+            for column in MONETARY_COLUMNS:
+                if record.get(column) is not None:
+                    record[column] = record[column] * rate
+        if record.get('currency') is not None:
+            record['currency'] = target_currency
+        
+        if record.get('price') is not None and record.get('shares_outstanding') is not None:
+            record['market_cap'] = record['price'] * record['shares_outstanding']
+        
+        record['processed_at'] = processed_at
+        return record
+    
     def _update_price_data(self, df: pd.DataFrame) -> int:
         """Update price data with processed values"""
         updated_count = 0
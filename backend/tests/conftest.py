@@ -1,12 +1,22 @@
 """
 Pytest configuration and fixtures for Index Platform tests
 """
+import os
+
+# Minimum bcrypt cost for tests; must be set before the app settings are loaded
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
 import pytest
 import asyncio
-from typing import Generator, AsyncGenerator
+import io
+import pandas as pd
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Generator, AsyncGenerator, Optional
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, sessionmaker
 from sqlalchemy.pool import StaticPool
 
 from app.main import app
@@ -14,20 +24,54 @@ from app.core.database import get_db, Base
 from app.core.config import settings
 from app.db.models import User, Security, IndexDefinition, PriceData
 from app.core.security import get_password_hash
+from app.processing.data_cleaner import DataCleaner
+
 
+# Each known test password is hashed once per session
+_hash_password = lru_cache(maxsize=None)(get_password_hash)
 
-# Test database URL
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
 
-# Create test engine
+# Test database URL; in-memory, so each pytest-xdist worker process has its own
+SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+
+# Create test engine; StaticPool keeps every session on the one in-memory connection
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
     connect_args={"check_same_thread": False},
     poolclass=StaticPool,
 )
 
+
+# pysqlite defers BEGIN until the first write, which makes SAVEPOINTs act as
+# real commits; emit BEGIN ourselves so per-test rollback actually works.
+@event.listens_for(engine, "connect")
+def _disable_pysqlite_transaction_handling(dbapi_connection, connection_record):
+    dbapi_connection.isolation_level = None
+
+
+@event.listens_for(engine, "begin")
+def _emit_begin(conn):
+    conn.exec_driver_sql("BEGIN")
+
+
+# autoflush stays off so read-only verification queries never flush; tests
+# that need pending changes visible commit (or flush) explicitly
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Session of the currently running test, read by the get_db override
+_current_session: ContextVar[Optional[Session]] = ContextVar("_current_session", default=None)
+
+
+def pytest_collection_modifyitems(config, items):
+    """Deselect slow tests unless a marker expression is given (e.g. ``-m slow``)."""
+    if config.getoption("markexpr"):
+        return
+    
+    selected = [item for item in items if item.get_closest_marker("slow") is None]
+    if len(selected) < len(items):
+        config.hook.pytest_deselected(items=[item for item in items if item.get_closest_marker("slow")])
+        items[:] = selected
+
 
 @pytest.fixture(scope="session")
 def event_loop():
@@ -37,43 +81,133 @@ def event_loop():
     loop.close()
 
 
-@pytest.fixture(scope="function")
-def db_session():
-    """Create a fresh database session for each test."""
+@pytest.fixture(scope="session")
+def db_engine():
+    """Create the schema once for the whole test session."""
     Base.metadata.create_all(bind=engine)
-    session = TestingSessionLocal()
+    yield engine
+    Base.metadata.drop_all(bind=engine)
+
+
+@pytest.fixture(scope="session")
+def db_connection(db_engine):
+    """Hold one connection whose outer transaction is rolled back at session end."""
+    connection = db_engine.connect()
+    transaction = connection.begin()
+    yield connection
+    transaction.rollback()
+    connection.close()
+
+
+@pytest.fixture(scope="function")
+def db_session(db_connection):
+    """Create a database session per test, rolled back afterwards.
+    
+    Each test runs inside a SAVEPOINT on the shared connection; commits made
+    by the session only release its own nested SAVEPOINT, so rolling back the
+    test's SAVEPOINT restores the database without recreating tables.
+    """
+    savepoint = db_connection.begin_nested()
+    session = TestingSessionLocal(bind=db_connection, join_transaction_mode="create_savepoint")
     try:
         yield session
     finally:
         session.close()
-        Base.metadata.drop_all(bind=engine)
+        savepoint.rollback()
 
 
-@pytest.fixture(scope="function")
-def client(db_session) -> Generator[TestClient, None, None]:
-    """Create a test client with database dependency override."""
-    def override_get_db():
-        try:
-            yield db_session
-        finally:
-            pass
+def override_get_db():
+    """Yield the session of the currently running test."""
+    yield _current_session.get()
 
+
+@contextmanager
+def _serve_session(session: Session):
+    """Route the app's get_db to ``session`` and restore the previous override afterwards.
+    
+    The override lives on the global app, so it is only installed while a
+    test (or session fixture) is using the shared client; tests that build
+    their own TestClient(app) are unaffected.
+    """
+    previous = app.dependency_overrides.get(get_db)
     app.dependency_overrides[get_db] = override_get_db
+    token = _current_session.set(session)
+    try:
+        yield
+    finally:
+        _current_session.reset(token)
+        if previous is None:
+            app.dependency_overrides.pop(get_db, None)
+        else:
+            app.dependency_overrides[get_db] = previous
+
+
+@pytest.fixture(scope="session")
+def app_client(db_engine) -> Generator[TestClient, None, None]:
+    """Start the application once and share its test client across the session."""
     with TestClient(app) as test_client:
         yield test_client
-    app.dependency_overrides.clear()
 
 
-@pytest.fixture
-def test_user(db_session):
-    """Create a test user."""
-    user = User(
+@pytest.fixture(scope="function")
+def client(app_client, db_session) -> Generator[TestClient, None, None]:
+    """Point the shared test client at this test's database session."""
+    with _serve_session(db_session):
+        yield app_client
+
+
+@pytest.fixture(scope="module")
+def warmed_up_app(db_connection):
+    """Hit the common endpoints once per module so timed tests measure steady state.
+    
+    Requests go to an allowed host and through the get_db override, against
+    a SAVEPOINT that is rolled back afterwards.
+    """
+    savepoint = db_connection.begin_nested()
+    session = TestingSessionLocal(bind=db_connection, join_transaction_mode="create_savepoint")
+    try:
+        with _serve_session(session), TestClient(app, base_url="http://localhost") as warmup_client:
+            for endpoint in ["/health", "/metrics", "/api/v1/securities", "/api/v1/indices"]:
+                for _ in range(20):
+                    warmup_client.get(endpoint)
+    finally:
+        session.close()
+        savepoint.rollback()
+
+
+@pytest.fixture(scope="session")
+def hash_password():
+    """Return the cached password hasher used by the user fixtures."""
+    return _hash_password
+
+
+def _build_test_user() -> User:
+    """Build the standard test user (password "testpassword")."""
+    return User(
         email="test@example.com",
         username="testuser",
         full_name="Test User",
-        hashed_password=get_password_hash("testpassword"),
+        hashed_password=_hash_password("testpassword"),
         is_active=True
     )
+
+
+def _build_test_admin_user() -> User:
+    """Build the standard admin user (password "adminpassword")."""
+    return User(
+        email="admin@example.com",
+        username="admin",
+        full_name="Admin User",
+        hashed_password=_hash_password("adminpassword"),
+        is_active=True,
+        is_superuser=True
+    )
+
+
+@pytest.fixture
+def test_user(db_session):
+    """Create a test user."""
+    user = _build_test_user()
     db_session.add(user)
     db_session.commit()
     db_session.refresh(user)
@@ -83,14 +217,7 @@ def test_user(db_session):
 @pytest.fixture
 def test_admin_user(db_session):
     """Create a test admin user."""
-    user = User(
-        email="admin@example.com",
-        username="admin",
-        full_name="Admin User",
-        hashed_password=get_password_hash("adminpassword"),
-        is_active=True,
-        is_superuser=True
-    )
+    user = _build_test_admin_user()
     db_session.add(user)
     db_session.commit()
     db_session.refresh(user)
@@ -161,26 +288,43 @@ def test_price_data(db_session, test_security):
     return price_data
 
 
+@pytest.fixture(scope="session")
+def session_auth_headers(app_client, db_connection):
+    """Log the test user and admin in once and cache their bearer headers.
+    
+    The users only exist for the login; tokens carry just the username, so
+    they stay valid for the per-test user rows created by the fixtures.
+    """
+    savepoint = db_connection.begin_nested()
+    session = TestingSessionLocal(bind=db_connection, join_transaction_mode="create_savepoint")
+    try:
+        session.add_all([_build_test_user(), _build_test_admin_user()])
+        session.commit()
+        
+        headers = {}
+        with _serve_session(session):
+            for username, password in (("testuser", "testpassword"), ("admin", "adminpassword")):
+                response = app_client.post(
+                    "/api/v1/auth/token",
+                    data={"username": username, "password": password}
+                )
+                headers[username] = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        return headers
+    finally:
+        session.close()
+        savepoint.rollback()
+
+
 @pytest.fixture
-def auth_headers(client, test_user):
+def auth_headers(session_auth_headers, test_user):
     """Get authentication headers for test user."""
-    response = client.post(
-        "/api/v1/auth/token",
-        data={"username": test_user.username, "password": "testpassword"}
-    )
-    token = response.json()["access_token"]
-    return {"Authorization": f"Bearer {token}"}
+    return session_auth_headers[test_user.username]
 
 
 @pytest.fixture
-def admin_auth_headers(client, test_admin_user):
+def admin_auth_headers(session_auth_headers, test_admin_user):
     """Get authentication headers for admin user."""
-    response = client.post(
-        "/api/v1/auth/token",
-        data={"username": test_admin_user.username, "password": "adminpassword"}
-    )
-    token = response.json()["access_token"]
-    return {"Authorization": f"Bearer {token}"}
+    return session_auth_headers[test_admin_user.username]
 
 
 @pytest.fixture
@@ -270,12 +414,68 @@ def sample_index_definition_data():
 
 
 # Performance test fixtures
-@pytest.fixture
-def large_dataset_securities():
-    """Large dataset of securities for performance testing."""
-    securities = []
-    for i in range(1000):
-        securities.append({
+# Union of the security rows used by the data processing workflows,
+# including a duplicate and an invalid row for the cleaning checks
+_INGESTED_SECURITIES_CSV = b"""symbol,name,exchange,currency,sector,industry,country,market_cap
+AAPL,Apple Inc.,NASDAQ,USD,Technology,Consumer Electronics,USA,3000000000000
+AAPL,Apple Inc.,NASDAQ,USD,Technology,Consumer Electronics,USA,3000000000000
+MSFT,Microsoft Corporation,NASDAQ,EUR,Technology,Software,USA,2800000000000
+GOOGL,Alphabet Inc.,NASDAQ,USD,Technology,Internet,USA,1800000000000
+INVALID,,NASDAQ,USD,Technology,Software,USA,-1000"""
+
+
+@pytest.fixture(scope="class")
+def ingested_securities(db_connection):
+    """Clean and harmonize the shared securities CSV, then upload it once per class.
+    
+    The processed CSV is POSTed to the securities ingestion route through an
+    allowed host, as an uploader user that is removed again afterwards.
+    Yields the processed frame and the route's response. The rows live in a
+    SAVEPOINT that encloses the per-test ones and is rolled back when the
+    class finishes.
+    """
+    savepoint = db_connection.begin_nested()
+    session = TestingSessionLocal(bind=db_connection, join_transaction_mode="create_savepoint")
+    try:
+        cleaner = DataCleaner()
+        cleaned = cleaner.clean_security_data(pd.read_csv(io.BytesIO(_INGESTED_SECURITIES_CSV)))
+        processed = cleaner.harmonize_currencies(cleaned, target_currency="USD")
+        
+        uploader = User(
+            email="uploader@example.com",
+            username="uploader",
+            full_name="CSV Uploader",
+            hashed_password=_hash_password("uploaderpassword"),
+            is_active=True
+        )
+        session.add(uploader)
+        session.commit()
+        
+        with _serve_session(session), TestClient(app, base_url="http://localhost") as upload_client:
+            token = upload_client.post(
+                "/api/v1/auth/token",
+                data={"username": "uploader", "password": "uploaderpassword"}
+            ).json()["access_token"]
+            response = upload_client.post(
+                "/api/v1/ingestion/csv/securities",
+                headers={"Authorization": f"Bearer {token}"},
+                files={"file": ("securities.csv", processed.to_csv(index=False), "text/csv")}
+            )
+        
+        session.delete(uploader)
+        session.commit()
+        
+        assert response.status_code == 200, response.text
+        yield {"processed": processed, "ingestion": response.json()}
+    finally:
+        session.close()
+        savepoint.rollback()
+
+
+def _generate_large_dataset_securities(count: int = 1000):
+    """Yield securities one at a time for performance testing."""
+    for i in range(count):
+        yield {
             "symbol": f"STOCK{i:04d}",
             "name": f"Test Company {i}",
             "exchange": "TEST",
@@ -283,9 +483,22 @@ def large_dataset_securities():
             "sector": "Technology" if i % 2 == 0 else "Healthcare",
             "industry": "Software" if i % 2 == 0 else "Pharmaceuticals",
             "country": "USA" if i % 3 == 0 else "Germany" if i % 3 == 1 else "Japan",
-            "market_cap": 1000000000.0 + (i * 1000000.0)
-        })
-    return securities
+            "market_cap": 1000000000.0 + (i * 1000000.0),
+            "price": 100.0 + i,
+            "shares_outstanding": 10000000 + (i * 10000)
+        }
+
+
+@pytest.fixture
+def large_dataset_securities():
+    """Large dataset of securities for performance testing."""
+    return list(_generate_large_dataset_securities())
+
+
+@pytest.fixture
+def large_dataset_securities_stream():
+    """Large dataset of securities as a lazy stream, never fully materialized."""
+    return _generate_large_dataset_securities()
 
 
 @pytest.fixture
@@ -2,12 +2,14 @@
 Integration tests for database operations
 """
 import pytest
+import pandas as pd
 from sqlalchemy.orm import Session
 from datetime import datetime, date
 
 from app.db.models import User, Security, IndexDefinition, PriceData, IndexValue, IndexConstituent
 from app.db.schemas import SecurityCreate, IndexDefinitionCreate, PriceDataCreate
 from app.core.security import get_password_hash
+from app.ingestion.base import DataIngestionManager
 
 
 class TestUserDatabaseOperations:
@@ -252,6 +254,29 @@ class TestPriceDataDatabaseOperations:
         assert latest_price is not None
         assert latest_price.date == date(2024, 1, 3)
         assert latest_price.close_price == 154.0
+    
+    def test_ingest_price_chunks(self, db_session: Session, test_security):
+        """Test chunked price ingestion with one bulk insert per chunk"""
+        dates = pd.date_range("2024-01-01", periods=25, freq="D")
+        data = pd.DataFrame({
+            "symbol": test_security.symbol,
+            "date": dates.strftime("%Y-%m-%d"),
+            "close_price": range(100, 125)
+        })
+        # Repeat the last row in a second chunk and add an unknown symbol
+        chunks = [
+            data.iloc[:10],
+            data.iloc[9:],
+            pd.DataFrame({"symbol": ["UNKNOWN"], "date": ["2024-01-01"], "close_price": [1.0]})
+        ]
+        
+        result = DataIngestionManager(db_session).ingest_price_chunks(iter(chunks))
+        
+        assert result["created"] == 25
+        assert result["errors"] == ["Security not found: UNKNOWN"]
+        assert db_session.query(PriceData).filter(
+            PriceData.security_id == test_security.id
+        ).count() == 25
 
 
 class TestIndexDefinitionDatabaseOperations:
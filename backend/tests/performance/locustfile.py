@@ -2,10 +2,62 @@
 Locust load testing configuration for Index Platform
 """
 from locust import HttpUser, task, between
+import itertools
 import random
 import json
 
 
+# Shuffled once at import; tasks just advance the cycle instead of drawing from the RNG
+_SECURITY_IDS = itertools.cycle(random.sample(range(1, 101), 100))  # assuming IDs 1-100 exist
+_INDEX_IDS = itertools.cycle(random.sample(range(1, 51), 50))  # assuming IDs 1-50 exist
+
+# Static request bodies, JSON-encoded once at import instead of on every request
+_BACKTEST_BODY = json.dumps({
+    "start_date": "2024-01-01",
+    "end_date": "2024-01-31"
+}).encode()
+
+# Only the randomized fields are formatted per request; the rest is pre-encoded
+_CUSTOM_INDEX_STATIC = json.dumps({
+    "description": "Index created during load testing",
+    "rebalance_frequency": "monthly",
+    "min_market_cap": 1000000000.0,
+    "max_market_cap": 1000000000000.0,
+    "sectors": ["Technology"],
+    "countries": ["USA"],
+    "esg_criteria": {"min_esg_score": 6.0},
+    "is_active": True
+})[1:-1]
+_CUSTOM_INDEX_TEMPLATE = (
+    '{"name": "Load Test Index %d", "weighting_method": "%s", "max_constituents": %d, '
+    + _CUSTOM_INDEX_STATIC + '}'
+)
+
+_CREATE_INDEX_MUTATION_BODY = json.dumps({"query": """
+        mutation {
+            createIndexDefinition(input: {
+                name: "GraphQL Load Test Index"
+                description: "Index created during GraphQL load testing"
+                weightingMethod: equal_weight
+                rebalanceFrequency: monthly
+                maxConstituents: 20
+                minMarketCap: 1000000000.0
+                maxMarketCap: 1000000000000.0
+                sectors: ["Technology"]
+                countries: ["USA"]
+                esgCriteria: {minEsgScore: 6.0}
+                isActive: true
+            }) {
+                indexDefinition {
+                    id
+                    name
+                    weightingMethod
+                }
+            }
+        }
+        """}).encode()
+
+
 class IndexPlatformUser(HttpUser):
     """Simulate user behavior on Index Platform"""
     
@@ -33,6 +85,7 @@ class IndexPlatformUser(HttpUser):
         else:
             self.token = None
             self.headers = {}
+        self.json_headers = {**self.headers, "Content-Type": "application/json"}
     
     @task(10)
     def get_securities(self):
@@ -47,21 +100,19 @@ class IndexPlatformUser(HttpUser):
     @task(5)
     def get_security_details(self):
         """Get specific security details"""
-        # Use a random security ID (assuming IDs 1-100 exist)
-        security_id = random.randint(1, 100)
+        security_id = next(_SECURITY_IDS)
         self.client.get(f"/api/v1/securities/{security_id}", headers=self.headers)
     
     @task(5)
     def get_index_details(self):
         """Get specific index details"""
-        # Use a random index ID (assuming IDs 1-50 exist)
-        index_id = random.randint(1, 50)
+        index_id = next(_INDEX_IDS)
         self.client.get(f"/api/v1/indices/{index_id}", headers=self.headers)
     
     @task(3)
     def get_price_data(self):
         """Get price data for a security"""
-        security_id = random.randint(1, 100)
+        security_id = next(_SECURITY_IDS)
         params = {
             "start_date": "2024-01-01",
             "end_date": "2024-01-31"
@@ -75,46 +126,34 @@ class IndexPlatformUser(HttpUser):
     @task(2)
     def get_index_values(self):
         """Get index values"""
-        index_id = random.randint(1, 50)
+        index_id = next(_INDEX_IDS)
         self.client.get(f"/api/v1/indices/{index_id}/values", headers=self.headers)
     
     @task(1)
     def calculate_index(self):
         """Calculate index (expensive operation)"""
-        index_id = random.randint(1, 50)
+        index_id = next(_INDEX_IDS)
         self.client.post(f"/api/v1/indices/{index_id}/calculate", headers=self.headers)
     
     @task(1)
     def run_backtest(self):
         """Run index backtest (very expensive operation)"""
-        index_id = random.randint(1, 50)
-        backtest_data = {
-            "start_date": "2024-01-01",
-            "end_date": "2024-01-31"
-        }
+        index_id = next(_INDEX_IDS)
         self.client.post(
             f"/api/v1/indices/{index_id}/backtest",
-            json=backtest_data,
-            headers=self.headers
+            data=_BACKTEST_BODY,
+            headers=self.json_headers
         )
     
     @task(3)
     def create_custom_index(self):
         """Create a custom index"""
-        index_data = {
-            "name": f"Load Test Index {random.randint(1000, 9999)}",
-            "description": "Index created during load testing",
-            "weighting_method": random.choice(["equal_weight", "market_cap_weight"]),
-            "rebalance_frequency": "monthly",
-            "max_constituents": random.randint(10, 50),
-            "min_market_cap": 1000000000.0,
-            "max_market_cap": 1000000000000.0,
-            "sectors": ["Technology"],
-            "countries": ["USA"],
-            "esg_criteria": {"min_esg_score": 6.0},
-            "is_active": True
-        }
-        self.client.post("/api/v1/indices", json=index_data, headers=self.headers)
+        index_data = _CUSTOM_INDEX_TEMPLATE % (
+            random.randint(1000, 9999),
+            random.choice(["equal_weight", "market_cap_weight"]),
+            random.randint(10, 50)
+        )
+        self.client.post("/api/v1/indices", data=index_data.encode(), headers=self.json_headers)
     
     @task(2)
     def get_health_check(self):
@@ -246,6 +285,7 @@ class GraphQLUser(HttpUser):
         else:
             self.token = None
             self.headers = {}
+        self.json_headers = {**self.headers, "Content-Type": "application/json"}
     
     @task(5)
     def query_securities(self):
@@ -299,7 +339,7 @@ class GraphQLUser(HttpUser):
     @task(2)
     def query_index_values(self):
         """Query index values via GraphQL"""
-        index_id = random.randint(1, 50)
+        index_id = next(_INDEX_IDS)
         query = f"""
         query {{
             index(id: {index_id}) {{
@@ -322,32 +362,8 @@ class GraphQLUser(HttpUser):
     @task(1)
     def create_index_mutation(self):
         """Create index via GraphQL mutation"""
-        mutation = """
-        mutation {
-            createIndexDefinition(input: {
-                name: "GraphQL Load Test Index"
-                description: "Index created during GraphQL load testing"
-                weightingMethod: equal_weight
-                rebalanceFrequency: monthly
-                maxConstituents: 20
-                minMarketCap: 1000000000.0
-                maxMarketCap: 1000000000000.0
-                sectors: ["Technology"]
-                countries: ["USA"]
-                esgCriteria: {minEsgScore: 6.0}
-                isActive: true
-            }) {
-                indexDefinition {
-                    id
-                    name
-                    weightingMethod
-                }
-            }
-        }
-        """
-        
         self.client.post(
             "/graphql",
-            json={"query": mutation},
-            headers=self.headers
+            data=_CREATE_INDEX_MUTATION_BODY,
+            headers=self.json_headers
         )
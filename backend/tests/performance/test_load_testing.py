@@ -3,16 +3,49 @@ Performance and load testing for Index Platform
 """
 import pytest
 import asyncio
+import os
 import time
 import statistics
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import List, Dict, Any
+import timeit
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from itertools import repeat
+from typing import List, Dict, Any, Tuple
+import httpx
+import numpy as np
+import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
 from fastapi.testclient import TestClient
 
 from app.main import app
 
 
+# Shared keep-alive session so repeated runs don't pay TCP setup per request
+_SESSION = requests.Session()
+_SESSION.mount("http://", HTTPAdapter(pool_connections=500, pool_maxsize=500, pool_block=False))
+
+
+# Warm routing, DI and the DB pool before anything in this module is timed
+pytestmark = pytest.mark.usefixtures("warmed_up_app")
+
+
+def _best_time(func, runs: int = 5) -> float:
+    """Fastest of several runs, so one scheduler hiccup can't fail a relative gate"""
+    return min(timeit.repeat(func, number=1, repeat=runs))
+
+
+def _calculate_market_cap_weights(securities: List[Dict[str, Any]]) -> List[float]:
+    """Module-level worker so it can be pickled into a process pool"""
+    from app.calculation.index_engine import IndexEngine
+    
+    return IndexEngine().calculate_market_cap_weights(securities)
+
+
+def _calculate_market_cap_weights_with_pid(securities: List[Dict[str, Any]]) -> Tuple[int, List[float]]:
+    """Pool worker that also reports which process ran it"""
+    return os.getpid(), _calculate_market_cap_weights(securities)
+
+
 class TestAPIPerformance:
     """Test API performance under load"""
     
@@ -64,18 +97,19 @@ class TestAPIPerformance:
         
         # Execute concurrent requests
         with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = [executor.submit(make_request) for _ in range(num_requests)]
-            results = [future.result() for future in as_completed(futures)]
+            results = list(executor.map(lambda _: make_request(), range(num_requests)))
         
         # Analyze results
-        response_times = [r["response_time"] for r in results]
+        response_times = np.asarray([r["response_time"] for r in results], dtype=np.float64)
         success_rate = sum(1 for r in results if r["success"]) / len(results)
+        p50, p95, p99 = np.percentile(response_times, [50, 95, 99])
         
         # Performance assertions
         assert success_rate >= 0.95  # 95% success rate
-        assert statistics.mean(response_times) < 2.0  # Average response time < 2s
-        assert max(response_times) < 5.0  # Max response time < 5s
-        assert statistics.median(response_times) < 1.5  # Median response time < 1.5s
+        assert response_times.mean() < 2.0  # Average response time < 2s
+        assert response_times.max() < 5.0  # Max response time < 5s
+        assert p50 < 1.5  # Median response time < 1.5s
+        assert p95 <= p99 < 5.0  # Tail latency stays under the max bound
     
     def test_high_load_performance(self):
         """Test API performance under high load"""
@@ -96,20 +130,21 @@ class TestAPIPerformance:
         # Execute high load requests
         start_time = time.time()
         with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = [executor.submit(make_request) for _ in range(num_requests)]
-            results = [future.result() for future in as_completed(futures)]
+            results = list(executor.map(lambda _: make_request(), range(num_requests)))
         total_time = time.time() - start_time
         
         # Analyze results
-        response_times = [r["response_time"] for r in results]
+        response_times = np.asarray([r["response_time"] for r in results], dtype=np.float64)
         success_rate = sum(1 for r in results if r["success"]) / len(results)
         throughput = num_requests / total_time
+        p50, p95, p99 = np.percentile(response_times, [50, 95, 99])
         
         # Performance assertions
         assert success_rate >= 0.90  # 90% success rate under high load
         assert throughput >= 10  # At least 10 requests per second
-        assert statistics.mean(response_times) < 3.0  # Average response time < 3s
-        assert max(response_times) < 10.0  # Max response time < 10s
+        assert response_times.mean() < 3.0  # Average response time < 3s
+        assert response_times.max() < 10.0  # Max response time < 10s
+        assert p50 <= p95 <= p99 < 10.0  # Tail latency stays under the max bound
     
     def test_database_query_performance(self):
         """Test database query performance"""
@@ -146,20 +181,20 @@ class TestAPIPerformance:
 class TestDataProcessingPerformance:
     """Test data processing performance"""
     
-    def test_large_dataset_processing(self, large_dataset_securities):
+    def test_large_dataset_processing(self, large_dataset_securities_stream):
         """Test processing of large datasets"""
         from app.processing.etl_pipeline import ETLPipeline
         
         pipeline = ETLPipeline()
         
-        # Test with large dataset
+        # Test with large dataset, streamed in chunks
         start_time = time.time()
-        processed_data = pipeline.run_pipeline(large_dataset_securities)
+        result = pipeline.run_pipeline_stream(large_dataset_securities_stream, chunk_size=10_000)
         end_time = time.time()
         
         processing_time = end_time - start_time
         
-        assert len(processed_data) == len(large_dataset_securities)
+        assert result["processed_rows"] == 1000
         assert processing_time < 30.0  # Should process 1000 records within 30s
     
     def test_index_calculation_performance(self, large_dataset_securities):
@@ -195,13 +230,18 @@ class TestDataProcessingPerformance:
         cleaner = DataCleaner()
         
         # Test duplicate removal
-        start_time = time.time()
         cleaned_data = cleaner.remove_duplicates(large_dataset_securities, key="symbol")
-        end_time = time.time()
+        cleaning_time = _best_time(lambda: cleaner.remove_duplicates(large_dataset_securities, key="symbol"))
         
-        cleaning_time = end_time - start_time
+        # Baseline: pandas hash-based dedup over the same records
+        baseline = pd.DataFrame(large_dataset_securities).drop_duplicates(subset=["symbol"]).to_dict("records")
+        baseline_time = _best_time(
+            lambda: pd.DataFrame(large_dataset_securities).drop_duplicates(subset=["symbol"]).to_dict("records")
+        )
         
+        assert len(cleaned_data) == len(baseline)
         assert cleaning_time < 2.0  # Should clean data within 2s
+        assert cleaning_time < 3 * baseline_time  # Should stay within 3x of pandas
     
     def test_data_transformation_performance(self, large_dataset_securities):
         """Test data transformation performance"""
@@ -209,15 +249,30 @@ class TestDataProcessingPerformance:
         
         transformer = DataTransformer()
         
+        # The transformer works on price frames; build one outside the timed region
+        frame = pd.DataFrame(large_dataset_securities).rename(columns={"price": "close_price"})
+        
         # Test market cap calculation
-        start_time = time.time()
-        transformed_data = transformer.calculate_market_cap(large_dataset_securities)
-        end_time = time.time()
+        transformed_data = transformer.calculate_market_cap(frame.copy(), shares_column="shares_outstanding")
+        transformation_time = _best_time(
+            lambda: transformer.calculate_market_cap(frame, shares_column="shares_outstanding")
+        )
+        
+        # Baseline: one vectorized multiply over contiguous float64 columns
+        n = len(large_dataset_securities)
         
-        transformation_time = end_time - start_time
+        def baseline():
+            prices = np.fromiter((r["price"] for r in large_dataset_securities), dtype=np.float64, count=n)
+            shares = np.fromiter((r["shares_outstanding"] for r in large_dataset_securities), dtype=np.float64, count=n)
+            return prices * shares
+        
+        market_caps = baseline()
+        baseline_time = _best_time(baseline)
         
         assert len(transformed_data) == len(large_dataset_securities)
+        assert np.allclose(transformed_data["market_cap"].to_numpy(), market_caps)
         assert transformation_time < 3.0  # Should transform data within 3s
+        assert transformation_time < baseline_time * 5  # Should stay within 5x of NumPy
 
 
 class TestMemoryUsage:
@@ -225,41 +280,56 @@ class TestMemoryUsage:
     
     def test_memory_usage_single_request(self):
         """Test memory usage for single requests"""
+        import gc
         import psutil
         import os
         
         process = psutil.Process(os.getpid())
-        initial_memory = process.memory_info().rss / 1024 / 1024  # MB
+        gc.collect()
+        initial_memory = process.memory_full_info().uss / 1024 / 1024  # MB
         
         # Make several requests
         for _ in range(10):
             response = self.client.get("/api/v1/securities")
             assert response.status_code in [200, 401]
         
-        final_memory = process.memory_info().rss / 1024 / 1024  # MB
+        gc.collect()
+        final_memory = process.memory_full_info().uss / 1024 / 1024  # MB
         memory_increase = final_memory - initial_memory
         
         # Memory increase should be reasonable
-        assert memory_increase < 100  # Less than 100MB increase
+        assert memory_increase < 50  # Less than 50MB increase
     
-    def test_memory_usage_large_dataset(self, large_dataset_securities):
+    def test_memory_usage_large_dataset(self, large_dataset_securities_stream):
         """Test memory usage with large datasets"""
+        import gc
         import psutil
         import os
-        
-        process = psutil.Process(os.getpid())
-        initial_memory = process.memory_info().rss / 1024 / 1024  # MB
-        
-        # Process large dataset
+        import tracemalloc
         from app.processing.etl_pipeline import ETLPipeline
-        pipeline = ETLPipeline()
-        processed_data = pipeline.run_pipeline(large_dataset_securities)
         
-        final_memory = process.memory_info().rss / 1024 / 1024  # MB
+        pipeline = ETLPipeline()
+        process = psutil.Process(os.getpid())
+        gc.collect()
+        initial_memory = process.memory_full_info().uss / 1024 / 1024  # MB
+        
+        # Trace only what the pipeline allocates, not the fixture
+        tracemalloc.start()
+        try:
+            result = pipeline.run_pipeline_stream(large_dataset_securities_stream, chunk_size=100)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        
+        gc.collect()
+        final_memory = process.memory_full_info().uss / 1024 / 1024  # MB
         memory_increase = final_memory - initial_memory
+        peak_memory = peak / 1024 / 1024  # MB
         
-        # Memory increase should be reasonable
-        assert memory_increase < 500  # Less than 500MB increase for 1000 records
+        # Peak should track the chunk size, not the dataset size
+        assert result["processed_rows"] == 1000
+        assert peak_memory < 50  # Less than 50MB peak for 1000 records
+        assert memory_increase < 50  # Less than 50MB retained for 1000 records
 
 
 class TestConcurrentOperations:
@@ -267,28 +337,47 @@ class TestConcurrentOperations:
     
     def test_concurrent_index_calculations(self):
         """Test concurrent index calculations"""
-        from app.calculation.index_engine import IndexEngine
+        ids = np.arange(100)
+        prices = 100.0 + ids.astype(np.float64)
+        market_caps = 1000000000.0 + ids * 1000000.0
+        num_concurrent = 10
         
-        engine = IndexEngine()
-        sample_data = [
-            {"id": i, "price": 100.0 + i, "market_cap": 1000000000.0 + i * 1000000}
-            for i in range(100)
-        ]
+        # The engine consumes records; marshal once, outside the timed regions
+        sample_data = pd.DataFrame(
+            {"id": ids, "price": prices, "market_cap": market_caps}
+        ).to_dict("records")
         
-        def calculate_weights():
-            return engine.calculate_market_cap_weights(sample_data)
+        # Baseline: a single vectorized NumPy call
+        start_time = time.time()
+        baseline_weights = market_caps / market_caps.sum()
+        baseline_time = time.time() - start_time
         
-        # Run concurrent calculations
-        num_concurrent = 10
-        with ThreadPoolExecutor(max_workers=num_concurrent) as executor:
-            futures = [executor.submit(calculate_weights) for _ in range(num_concurrent)]
-            results = [future.result() for future in as_completed(futures)]
+        # Serial reference run
+        start_time = time.time()
+        serial_results = [_calculate_market_cap_weights(sample_data) for _ in range(num_concurrent)]
+        serial_time = time.time() - start_time
         
-        # All calculations should complete successfully
+        # Run concurrent calculations, one GIL per worker process
+        start_time = time.time()
+        with ProcessPoolExecutor(max_workers=num_concurrent) as executor:
+            pids, results = zip(*executor.map(_calculate_market_cap_weights_with_pid, repeat(sample_data, num_concurrent)))
+        parallel_time = time.time() - start_time
+        
+        # All calculations should complete successfully and match the serial run
         assert len(results) == num_concurrent
-        for result in results:
+        assert list(results) == serial_results
+        
+        # The work should really have been spread over several worker processes
+        assert os.getpid() not in pids
+        assert len(set(pids)) > 1
+        for result in serial_results:
             assert len(result) == len(sample_data)
             assert abs(sum(result) - 1.0) < 0.001  # Weights should sum to 1
+            assert np.allclose(result, baseline_weights)
+        
+        # Engine should stay within reach of the vectorized baseline
+        assert serial_time / num_concurrent < max(baseline_time * 100, 0.01)
+        assert parallel_time < 10.0
     
     def test_concurrent_data_ingestion(self, sample_securities_data):
         """Test concurrent data ingestion"""
@@ -303,8 +392,7 @@ class TestConcurrentOperations:
         # Run concurrent ingestion
         num_concurrent = 5
         with ThreadPoolExecutor(max_workers=num_concurrent) as executor:
-            futures = [executor.submit(ingest_data) for _ in range(num_concurrent)]
-            results = [future.result() for future in as_completed(futures)]
+            results = list(executor.map(lambda _: ingest_data(), range(num_concurrent)))
         
         # All ingestion should complete successfully
         assert len(results) == num_concurrent
@@ -357,8 +445,7 @@ class TestScalability:
             
             # Simulate concurrent users
             with ThreadPoolExecutor(max_workers=num_users) as executor:
-                futures = [executor.submit(make_request) for _ in range(num_users)]
-                response_times = [future.result() for future in as_completed(futures)]
+                response_times = list(executor.map(lambda _: make_request(), range(num_users)))
             
             avg_response_time = statistics.mean(response_times)
             results.append((num_users, avg_response_time))
@@ -399,20 +486,19 @@ class TestResourceUtilization:
         import tempfile
         import os
         
-        # Test file write performance
-        with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-            start_time = time.time()
-            
-            # Write large amount of data
-            data = "x" * 1024 * 1024  # 1MB
-            for _ in range(10):  # 10MB total
-                temp_file.write(data.encode())
-            
-            end_time = time.time()
-            write_time = end_time - start_time
+        # Build the 10MB payload before timing so only the write is measured
+        data = b"x" * (10 * 1024 * 1024)
+        fd, path = tempfile.mkstemp()
         
-        # Clean up
-        os.unlink(temp_file.name)
+        try:
+            start_time = time.perf_counter_ns()
+            os.write(fd, data)
+            os.fsync(fd)  # Measure the disk, not the page cache
+            write_time = (time.perf_counter_ns() - start_time) / 1e9
+        finally:
+            os.close(fd)
+            # Clean up
+            os.unlink(path)
         
         # Write performance should be reasonable
         assert write_time < 5.0  # Should write 10MB within 5s
@@ -423,7 +509,7 @@ class TestResourceUtilization:
         if hasattr(self, 'base_url') and self.base_url.startswith('http://'):
             try:
                 start_time = time.time()
-                response = requests.get(f"{self.base_url}/health", timeout=5)
+                response = _SESSION.get(f"{self.base_url}/health", timeout=5)
                 end_time = time.time()
                 
                 response_time = end_time - start_time
@@ -469,17 +555,29 @@ class TestPerformanceRegression:
         """Test that throughput doesn't regress"""
         endpoint = "/api/v1/securities"
         num_requests = 100
+        max_in_flight = 32
         
-        start_time = time.time()
-        
-        # Make requests sequentially
-        for _ in range(num_requests):
-            response = self.client.get(endpoint)
-            assert response.status_code in [200, 401]
+        async def run():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://localhost", follow_redirects=True) as client:
+                semaphore = asyncio.Semaphore(max_in_flight)
+                
+                async def make_request():
+                    async with semaphore:
+                        return await client.get(endpoint)
+                
+                return await asyncio.gather(*[make_request() for _ in range(num_requests)])
         
+        # Keep requests in flight concurrently instead of one at a time
+        start_time = time.time()
+        responses = asyncio.run(run())
         end_time = time.time()
+        
         total_time = end_time - start_time
         throughput = num_requests / total_time
         
-        # Should maintain at least 10 requests per second
-        assert throughput >= 10.0
+        for response in responses:
+            assert response.status_code in [200, 401]
+        
+        # Should maintain at least 200 requests per second
+        assert throughput >= 200.0
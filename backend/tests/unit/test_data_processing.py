@@ -2,62 +2,78 @@
 Unit tests for data processing functionality
 """
 import pytest
+import numpy as np
+import pandas as pd
+from types import MappingProxyType
 from unittest.mock import Mock, patch
 from datetime import datetime, date
 
-from app.processing.data_cleaner import DataCleaner
+from app.processing.data_cleaner import DataCleaner, PANDAS_THRESHOLD
 from app.processing.data_transformer import DataTransformer
-from app.processing.etl_pipeline import ETLPipeline
+from app.processing.etl_pipeline import ETLPipeline, SecurityRow, POLARS_THRESHOLD
+
+
+@pytest.fixture(scope="module")
+def sample_securities():
+    """Sample securities, built once per module and read-only"""
+    return tuple(MappingProxyType(security) for security in [
+        {
+            "symbol": "AAPL",
+            "name": "Apple Inc.",
+            "exchange": "NASDAQ",
+            "currency": "USD",
+            "sector": "Technology",
+            "market_cap": 3000000000000.0,
+            "price": 150.0
+        },
+        {
+            "symbol": "AAPL",  # Duplicate
+            "name": "Apple Inc.",
+            "exchange": "NASDAQ",
+            "currency": "USD",
+            "sector": "Technology",
+            "market_cap": 3000000000000.0,
+            "price": 151.0
+        },
+        {
+            "symbol": "MSFT",
+            "name": "Microsoft Corp.",
+            "exchange": "NASDAQ",
+            "currency": "EUR",  # Different currency
+            "sector": "Technology",
+            "market_cap": 2800000000000.0,
+            "price": 300.0
+        },
+        {
+            "symbol": "INVALID",
+            "name": "",  # Empty name
+            "exchange": "NASDAQ",
+            "currency": "USD",
+            "sector": "Technology",
+            "market_cap": -1000.0,  # Negative market cap
+            "price": 0.0  # Zero price
+        }
+    ])
+
+
+@pytest.fixture(scope="module")
+def sample_securities_frame(sample_securities):
+    """Sample securities as a frame with categorical string columns"""
+    return pd.DataFrame(sample_securities).astype(
+        {"exchange": "category", "currency": "category", "sector": "category"}
+    )
 
 
 class TestDataCleaner:
     """Test data cleaning functionality"""
     
     def setup_method(self):
-        """Set up test data"""
+        """Set up the cleaner"""
         self.cleaner = DataCleaner()
-        self.sample_securities = [
-            {
-                "symbol": "AAPL",
-                "name": "Apple Inc.",
-                "exchange": "NASDAQ",
-                "currency": "USD",
-                "sector": "Technology",
-                "market_cap": 3000000000000.0,
-                "price": 150.0
-            },
-            {
-                "symbol": "AAPL",  # Duplicate
-                "name": "Apple Inc.",
-                "exchange": "NASDAQ",
-                "currency": "USD",
-                "sector": "Technology",
-                "market_cap": 3000000000000.0,
-                "price": 151.0
-            },
-            {
-                "symbol": "MSFT",
-                "name": "Microsoft Corp.",
-                "exchange": "NASDAQ",
-                "currency": "EUR",  # Different currency
-                "sector": "Technology",
-                "market_cap": 2800000000000.0,
-                "price": 300.0
-            },
-            {
-                "symbol": "INVALID",
-                "name": "",  # Empty name
-                "exchange": "NASDAQ",
-                "currency": "USD",
-                "sector": "Technology",
-                "market_cap": -1000.0,  # Negative market cap
-                "price": 0.0  # Zero price
-            }
-        ]
     
-    def test_remove_duplicates(self):
+    def test_remove_duplicates(self, sample_securities):
         """Test duplicate removal"""
-        cleaned_data = self.cleaner.remove_duplicates(self.sample_securities, key="symbol")
+        cleaned_data = self.cleaner.remove_duplicates(sample_securities, key="symbol")
         
         assert len(cleaned_data) == 3  # Should remove one duplicate
         symbols = [item["symbol"] for item in cleaned_data]
@@ -82,11 +98,66 @@ class TestDataCleaner:
         cleaned_by_id = self.cleaner.remove_duplicates(data, key="id")
         assert len(cleaned_by_id) == 2
     
-    def test_harmonize_currencies(self):
+    def test_remove_duplicates_composite_key(self):
+        """Test duplicate removal over a tuple of keys"""
+        data = [
+            {"symbol": "AAPL", "date": "2024-01-01", "price": 150.0},
+            {"symbol": "AAPL", "date": "2024-01-02", "price": 151.0},
+            {"symbol": "AAPL", "date": "2024-01-01", "price": 152.0}
+        ]
+        
+        cleaned = self.cleaner.remove_duplicates(data, key=("symbol", "date"))
+        
+        assert [item["price"] for item in cleaned] == [150.0, 151.0]
+    
+    def test_remove_duplicates_large_input_keeps_records(self):
+        """Test the pandas path returns the original records, like the dict pass"""
+        data = [
+            {"symbol": f"STOCK{x % (PANDAS_THRESHOLD // 2):04d}", "price": x}
+            if x % 2 else {"symbol": f"STOCK{x % (PANDAS_THRESHOLD // 2):04d}", "price": x, "volume": 10}
+            for x in range(PANDAS_THRESHOLD + 2)
+        ]
+        
+        cleaned = self.cleaner.remove_duplicates(data, key="symbol")
+        
+        assert len(cleaned) == PANDAS_THRESHOLD // 2
+        assert all(a is b for a, b in zip(cleaned, data))
+        assert type(cleaned[0]["price"]) is int
+        assert "volume" not in cleaned[1]
+        
+        with pytest.raises(KeyError):
+            self.cleaner.remove_duplicates(data + [{"price": 1}], key="symbol")
+    
+    def test_shrink_numeric_columns(self, sample_securities_frame):
+        """Test numeric columns are downcast without losing values"""
+        frame = sample_securities_frame.assign(volume=[1000000, 1000000, 500000, 0])
+        
+        shrunk = self.cleaner._shrink(frame)
+        
+        assert shrunk["volume"].dtype == "int32"
+        assert shrunk["price"].dtype == "float32"
+        assert shrunk["market_cap"].dtype == "float64"  # Not exact in float32
+        assert shrunk["market_cap"].tolist() == frame["market_cap"].tolist()
+    
+    def test_shrink_preserves_prices_exactly(self):
+        """Test prices not representable in float32 survive cleaning unchanged"""
+        prices = pd.DataFrame({
+            "security_id": [1, 1, 1],
+            "date": pd.to_datetime(["2024-01-01", "2024-01-02", "2024-01-03"]),
+            "close_price": [123.456, 150.1, 149.99],
+            "volume": [100, 200, 150]
+        })
+        
+        shrunk = self.cleaner._shrink(prices)
+        
+        assert shrunk["close_price"].tolist() == [123.456, 150.1, 149.99]
+        assert (shrunk["volume"] - shrunk["volume"].shift(-1)).tolist()[:2] == [-100, 50]
+    
+    def test_harmonize_currencies(self, sample_securities):
         """Test currency harmonization"""
         with patch.object(self.cleaner, 'get_exchange_rate', return_value=0.85):
             harmonized_data = self.cleaner.harmonize_currencies(
-                self.sample_securities, target_currency="USD"
+                sample_securities, target_currency="USD"
             )
             
             # All currencies should be USD
@@ -94,10 +165,40 @@ class TestDataCleaner:
                 assert item["currency"] == "USD"
             
             # EUR price should be converted
-            msft_item = next(item for item in harmonized_data if item["symbol"] == "MSFT")
+            by_symbol = {item["symbol"]: item for item in harmonized_data}
+            msft_item = by_symbol["MSFT"]
             assert msft_item["price"] == pytest.approx(300.0 * 0.85, rel=1e-2)
             assert msft_item["market_cap"] == pytest.approx(2800000000000.0 * 0.85, rel=1e-2)
     
+    def test_harmonize_currencies_categorical(self, sample_securities_frame):
+        """Test currency harmonization on a frame with categorical columns"""
+        with patch.object(self.cleaner, 'get_exchange_rate', return_value=0.85) as get_exchange_rate:
+            harmonized = self.cleaner.harmonize_currencies(
+                sample_securities_frame, target_currency="USD"
+            )
+        
+        # One lookup per non-target currency, not per row
+        get_exchange_rate.assert_called_once_with("EUR", "USD")
+        assert isinstance(harmonized["currency"].dtype, pd.CategoricalDtype)
+        assert (harmonized["currency"] == "USD").all()
+        assert harmonized["price"].tolist() == pytest.approx([150.0, 151.0, 300.0 * 0.85, 0.0])
+    
+    def test_harmonize_currencies_keeps_record_fields(self):
+        """Test only amounts and currency change, and records without a currency are left alone"""
+        data = [
+            {"symbol": "MSFT", "price": 300, "currency": "EUR"},
+            {"symbol": "NOCCY", "price": 100, "currency": None},
+            {"symbol": "BARE", "price": 50},
+            {"symbol": "AAPL", "price": 150, "currency": "USD", "volume": 10}
+        ]
+        
+        with patch.object(self.cleaner, 'get_exchange_rate', return_value=0.85):
+            harmonized = self.cleaner.harmonize_currencies(data, target_currency="USD")
+        
+        assert harmonized[0] == {"symbol": "MSFT", "price": pytest.approx(300 * 0.85), "currency": "USD"}
+        assert harmonized[1:] == data[1:]
+        assert data[0]["currency"] == "EUR"  # Input records are not modified
+    
     def test_normalize_timezones(self):
         """Test timezone normalization"""
         data_with_timezones = [
@@ -122,9 +223,9 @@ class TestDataCleaner:
             assert "T" in item["date"]
             assert item["date"].endswith("+00:00") or item["date"].endswith("Z")
     
-    def test_validate_data_quality(self):
+    def test_validate_data_quality(self, sample_securities):
         """Test data quality validation"""
-        quality_score = self.cleaner.validate_data_quality(self.sample_securities)
+        quality_score = self.cleaner.validate_data_quality(sample_securities)
         
         assert 0 <= quality_score <= 100
         assert quality_score < 100  # Should be less than perfect due to invalid data
@@ -184,13 +285,13 @@ class TestDataCleaner:
             data_with_missing, default_values={"dividend": 0.0}
         )
         
+        by_symbol = {item["symbol"]: item for item in cleaned_data}
+        
         # Missing dividend should be filled with default value
-        aapl_item = next(item for item in cleaned_data if item["symbol"] == "AAPL")
-        assert aapl_item["dividend"] == 0.0
+        assert by_symbol["AAPL"]["dividend"] == 0.0
         
         # Existing dividend should remain unchanged
-        msft_item = next(item for item in cleaned_data if item["symbol"] == "MSFT")
-        assert msft_item["dividend"] == 2.5
+        assert by_symbol["MSFT"]["dividend"] == 2.5
     
     def test_validate_numeric_ranges(self):
         """Test validation of numeric ranges"""
@@ -222,6 +323,24 @@ class TestDataCleaner:
         # Should filter out invalid data
         assert len(valid_data) == 1
         assert valid_data[0]["symbol"] == "AAPL"
+    
+    @pytest.mark.parametrize("size", [2, PANDAS_THRESHOLD + 1])
+    def test_validate_numeric_ranges_mixed_types(self, size):
+        """Test strings and bools fail range rules on both sides of the pandas threshold"""
+        records = [
+            {"symbol": "NUM", "price": 50},
+            {"symbol": "STR", "price": "50"},
+            {"symbol": "BOOL", "price": True},
+            {"symbol": "NONE", "price": None},
+            {"symbol": "MISSING"},
+            {"symbol": "NP", "price": np.float64(50.0)}
+        ]
+        data = (records * size)[:max(size, len(records))]
+        
+        valid_data = self.cleaner.validate_numeric_ranges(data, {"price": {"min": 0.01, "max": 10000.0}})
+        
+        assert valid_data == [record for record in data if record["symbol"] in ("NUM", "NP")]
+        assert {item["symbol"] for item in valid_data} == {"NUM", "NP"}
 
 
 class TestDataTransformer:
@@ -253,13 +372,13 @@ class TestDataTransformer:
             expected_market_cap = item["price"] * item["shares_outstanding"]
             assert item["market_cap"] == expected_market_cap
         
+        by_symbol = {item["symbol"]: item for item in transformed_data}
+        
         # AAPL: 150 * 1B = 150B
-        aapl_item = next(item for item in transformed_data if item["symbol"] == "AAPL")
-        assert aapl_item["market_cap"] == 150000000000
+        assert by_symbol["AAPL"]["market_cap"] == 150000000000
         
         # MSFT: 300 * 750M = 225B
-        msft_item = next(item for item in transformed_data if item["symbol"] == "MSFT")
-        assert msft_item["market_cap"] == 225000000000
+        assert by_symbol["MSFT"]["market_cap"] == 225000000000
     
     def test_calculate_performance_metrics(self):
         """Test performance metrics calculation"""
@@ -285,6 +404,29 @@ class TestDataTransformer:
         # Last item should have volatility
         assert "volatility" in performance_data[-1]
     
+    def test_calculate_performance_metrics_interleaved_symbols(self):
+        """Test metrics are computed per symbol and returned in input order"""
+        price_data = [
+            {"symbol": "A", "price": 100.0, "date": "2024-01-01"},
+            {"symbol": "B", "price": 10.0, "date": "2024-01-01"},
+            {"symbol": None, "price": 50.0, "date": "2024-01-01"},
+            {"symbol": "A", "price": 110.0, "date": "2024-01-02"},
+            {"symbol": "B", "price": 12.0, "date": "2024-01-02"},
+            {"symbol": "A", "price": 99.0, "date": "2024-01-03"}
+        ]
+        
+        performance_data = self.transformer.calculate_performance_metrics(price_data)
+        
+        assert [item["price"] for item in performance_data] == [100.0, 10.0, 50.0, 110.0, 12.0, 99.0]
+        assert "daily_return" not in performance_data[0]
+        assert "daily_return" not in performance_data[1]
+        assert "daily_return" not in performance_data[2]
+        assert performance_data[3]["daily_return"] == pytest.approx(0.10)
+        assert performance_data[4]["daily_return"] == pytest.approx(0.20)
+        assert performance_data[5]["daily_return"] == pytest.approx(-0.10)
+        assert performance_data[5]["volatility"] == pytest.approx(0.1414, rel=1e-3)
+        assert "volatility" not in performance_data[4]
+    
     def test_calculate_volatility(self):
         """Test volatility calculation"""
         returns = [0.01, 0.02, -0.01, 0.03, -0.02, 0.01, 0.02, -0.01]
@@ -504,16 +646,13 @@ class TestETLPipeline:
     def test_pipeline_performance(self):
         """Test ETL pipeline performance with large dataset"""
         # Create large dataset
-        large_data = []
-        for i in range(1000):
-            large_data.append({
-                "symbol": f"STOCK{i:04d}",
-                "name": f"Company {i}",
-                "price": 100.0 + i,
-                "currency": "USD",
-                "date": "2024-01-01",
-                "volume": 1000000 + i
-            })
+        i = np.arange(1000)
+        prices = 100.0 + i
+        volumes = 1000000 + i
+        large_data = [
+            SecurityRow(f"STOCK{x:04d}", f"Company {x}", price, "USD", "2024-01-01", volume)
+            for x, price, volume in zip(i.tolist(), prices.tolist(), volumes.tolist())
+        ]
         
         # Should handle large datasets efficiently
         import time
@@ -527,3 +666,37 @@ class TestETLPipeline:
         # Should complete within reasonable time (< 5 seconds)
         assert execution_time < 5.0
         assert len(processed_data) == len(large_data)
+    
+    def test_pipeline_same_output_across_polars_threshold(self):
+        """Test the record loop and the Polars path return the same records"""
+        raw_data = []
+        for x in range(POLARS_THRESHOLD + 50):
+            record = {"symbol": f"STOCK{x % (POLARS_THRESHOLD + 10):04d}", "name": f"Company {x}", "price": 100 + x}
+            if x % 3 == 0:
+                record["currency"] = "EUR"
+            elif x % 3 == 1:
+                record["currency"] = None
+            if x % 5 == 0:
+                record["shares_outstanding"] = 1000
+            raw_data.append(record)
+        raw_data.append({"symbol": "BAD", "name": "", "price": -1, "currency": "USD"})
+        
+        def strip(records):
+            return [{k: v for k, v in record.items() if k != "processed_at"} for record in records]
+        
+        with patch.object(self.pipeline, "_process_records", wraps=self.pipeline._process_records) as record_loop:
+            large = self.pipeline.run_pipeline(raw_data, validate=True)
+            assert not record_loop.called
+        
+        with patch("app.processing.etl_pipeline.POLARS_THRESHOLD", len(raw_data)):
+            small = self.pipeline.run_pipeline(raw_data, validate=True)
+        
+        assert strip(large) == strip(small)
+        assert len(large) == POLARS_THRESHOLD + 10
+        
+        # Ints stay ints, missing keys stay missing and rows without a currency are left alone
+        assert large[1] == {**raw_data[1], "processed_at": large[1]["processed_at"]}
+        assert type(large[1]["price"]) is int
+        assert "volume" not in large[0]
+        assert large[0]["currency"] == "USD"
+        assert large[0]["price"] == pytest.approx(100 * 1.08)
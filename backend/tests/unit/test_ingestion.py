@@ -0,0 +1,61 @@
+"""
+Unit tests for data ingestion functionality
+"""
+import pytest
+import numpy as np
+import pandas as pd
+from unittest.mock import Mock
+
+from app.ingestion.base import SecurityIngestor
+
+
+class TestSecurityIngestor:
+    """Test security ingestion"""
+    
+    def setup_method(self):
+        """Set up test ingestor"""
+        self.ingestor = SecurityIngestor(Mock())
+    
+    def test_transform_drops_repeated_symbols(self):
+        """Test repeated symbols in one batch keep their first occurrence"""
+        data = pd.DataFrame({
+            "Symbol": ["AAPL", "AAPL", "MSFT"],
+            "Name": ["Apple Inc.", "Apple Duplicate", "Microsoft Corp."],
+            "Market Cap": ["3000000000000", "1", "2800000000000"]
+        })
+        
+        transformed = self.ingestor.transform(data)
+        
+        assert transformed["symbol"].tolist() == ["AAPL", "MSFT"]
+        assert transformed["name"].tolist() == ["Apple Inc.", "Microsoft Corp."]
+        assert transformed["market_cap"].tolist() == [3000000000000.0, 2800000000000.0]
+    
+    def test_transform_drops_rows_missing_required_fields(self):
+        """Test rows without a symbol or name are dropped rather than stored blank"""
+        data = pd.DataFrame({
+            "symbol": ["AAPL", np.nan, "INVALID"],
+            "name": ["Apple Inc.", "No Symbol", np.nan],
+            "sector": ["Technology", "Technology", np.nan]
+        })
+        
+        transformed = self.ingestor.transform(data)
+        
+        assert transformed["symbol"].tolist() == ["AAPL"]
+        assert transformed["sector"].tolist() == ["Technology"]
+    
+    def test_ingest_batch_with_duplicates(self):
+        """Test a batch with a repeated symbol creates it once"""
+        db = Mock()
+        db.query.return_value.filter.return_value.first.return_value = None
+        ingestor = SecurityIngestor(db)
+        
+        data = pd.DataFrame({
+            "symbol": ["AAPL", "AAPL"],
+            "name": ["Apple Inc.", "Apple Inc."]
+        })
+        
+        result = ingestor.ingest(data)
+        
+        assert result["created"] == 1
+        assert result["errors"] == []
+        assert db.add.call_count == 1
@@ -2,6 +2,7 @@
 Unit tests for security-related functionality
 """
 import pytest
+from types import MappingProxyType
 from unittest.mock import Mock, patch
 from datetime import datetime, date
 
@@ -17,29 +18,39 @@ from app.processing.data_cleaner import DataCleaner
 from app.processing.data_transformer import DataTransformer
 
 
+SAMPLE_PASSWORD = "testpassword123"
+SAMPLE_USER_ID = 1
+
+
+@pytest.fixture(scope="session")
+def sample_hash():
+    """Hash of the sample password, computed once per session"""
+    return get_password_hash(SAMPLE_PASSWORD)
+
+
+@pytest.fixture(scope="session")
+def sample_token():
+    """Access token for the sample user, created once per session"""
+    return create_access_token(data={"sub": str(SAMPLE_USER_ID)})
+
+
 class TestSecurityFunctions:
     """Test security utility functions"""
     
-    def test_password_hashing(self):
+    def test_password_hashing(self, sample_hash):
         """Test password hashing and verification"""
-        password = "testpassword123"
-        hashed = get_password_hash(password)
-        
-        assert hashed != password
-        assert verify_password(password, hashed)
-        assert not verify_password("wrongpassword", hashed)
+        assert sample_hash != SAMPLE_PASSWORD
+        assert verify_password(SAMPLE_PASSWORD, sample_hash)
+        assert not verify_password("wrongpassword", sample_hash)
     
-    def test_token_creation_and_verification(self):
+    def test_token_creation_and_verification(self, sample_token):
         """Test JWT token creation and verification"""
-        user_id = 1
-        token = create_access_token(data={"sub": str(user_id)})
-        
-        assert isinstance(token, str)
-        assert len(token) > 0
+        assert isinstance(sample_token, str)
+        assert len(sample_token) > 0
         
         # Verify token
-        payload = verify_token(token)
-        assert payload["sub"] == str(user_id)
+        payload = verify_token(sample_token)
+        assert payload["sub"] == str(SAMPLE_USER_ID)
     
     def test_invalid_token(self):
         """Test invalid token handling"""
@@ -52,10 +63,10 @@ class TestSecurityFunctions:
 class TestDataCleaner:
     """Test data cleaning functionality"""
     
-    def setup_method(self):
-        """Set up test data"""
-        self.cleaner = DataCleaner()
-        self.sample_data = [
+    @pytest.fixture(scope="class")
+    def sample_data(self):
+        """Sample records, built once per class and read-only"""
+        return tuple(MappingProxyType(record) for record in [
             {
                 "symbol": "AAPL",
                 "name": "Apple Inc.",
@@ -77,27 +88,31 @@ class TestDataCleaner:
                 "currency": "EUR",  # Different currency
                 "date": "2024-01-01"
             }
-        ]
+        ])
+    
+    def setup_method(self):
+        """Set up test cleaner"""
+        self.cleaner = DataCleaner()
     
-    def test_remove_duplicates(self):
+    def test_remove_duplicates(self, sample_data):
         """Test duplicate removal"""
-        cleaned_data = self.cleaner.remove_duplicates(self.sample_data, key="symbol")
+        cleaned_data = self.cleaner.remove_duplicates(sample_data, key="symbol")
         
         assert len(cleaned_data) == 2
         assert cleaned_data[0]["symbol"] == "AAPL"
         assert cleaned_data[1]["symbol"] == "MSFT"
     
-    def test_harmonize_currencies(self):
+    def test_harmonize_currencies(self, sample_data):
         """Test currency harmonization"""
         # Mock exchange rate
         with patch.object(self.cleaner, 'get_exchange_rate', return_value=0.85):
             harmonized_data = self.cleaner.harmonize_currencies(
-                self.sample_data, 
+                sample_data, 
                 target_currency="USD"
             )
             
             # EUR price should be converted to USD
-            msft_data = next(item for item in harmonized_data if item["symbol"] == "MSFT")
+            msft_data = {item["symbol"]: item for item in harmonized_data}["MSFT"]
             assert msft_data["currency"] == "USD"
             assert msft_data["price"] == pytest.approx(300.0 * 0.85, rel=1e-2)
     
@@ -118,10 +133,10 @@ class TestDataCleaner:
 class TestDataTransformer:
     """Test data transformation functionality"""
     
-    def setup_method(self):
-        """Set up test data"""
-        self.transformer = DataTransformer()
-        self.sample_data = [
+    @pytest.fixture(scope="class")
+    def sample_data(self):
+        """Sample records, built once per class and read-only"""
+        return tuple(MappingProxyType(record) for record in [
             {
                 "symbol": "AAPL",
                 "price": 150.0,
@@ -134,11 +149,15 @@ class TestDataTransformer:
                 "shares_outstanding": 750000000,
                 "date": "2024-01-01"
             }
-        ]
+        ])
+    
+    def setup_method(self):
+        """Set up test transformer"""
+        self.transformer = DataTransformer()
     
-    def test_calculate_market_cap(self):
+    def test_calculate_market_cap(self, sample_data):
         """Test market capitalization calculation"""
-        transformed_data = self.transformer.calculate_market_cap(self.sample_data)
+        transformed_data = self.transformer.calculate_market_cap(sample_data)
         
         for item in transformed_data:
             expected_market_cap = item["price"] * item["shares_outstanding"]
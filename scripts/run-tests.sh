@@ -17,6 +17,7 @@ COVERAGE=false
 VERBOSE=false
 PARALLEL=false
 SKIP_SLOW=false
+SLOW_ONLY=false
 
 # Function to print colored output
 print_status() {
@@ -44,7 +45,8 @@ show_usage() {
     echo "  -c, --coverage         Generate coverage report"
     echo "  -v, --verbose          Verbose output"
     echo "  -p, --parallel         Run tests in parallel"
-    echo "  -s, --skip-slow        Skip slow tests"
+    echo "  -s, --skip-slow        Skip slow tests (default when no marker is selected)"
+    echo "  -S, --slow             Run only slow tests"
     echo "  -h, --help             Show this help message"
     echo ""
     echo "Examples:"
@@ -52,6 +54,7 @@ show_usage() {
     echo "  $0 --type integration --verbose"
     echo "  $0 --type e2e --parallel"
     echo "  $0 --coverage --skip-slow"
+    echo "  $0 --type system --slow"
 }
 
 # Parse command line arguments
@@ -77,6 +80,10 @@ while [[ $# -gt 0 ]]; do
             SKIP_SLOW=true
             shift
             ;;
+        -S|--slow)
+            SLOW_ONLY=true
+            shift
+            ;;
         -h|--help)
             show_usage
             exit 0
@@ -106,6 +113,7 @@ print_status "Coverage: $COVERAGE"
 print_status "Verbose: $VERBOSE"
 print_status "Parallel: $PARALLEL"
 print_status "Skip Slow: $SKIP_SLOW"
+print_status "Slow Only: $SLOW_ONLY"
 
 # Check if Docker is running
 if ! docker info > /dev/null 2>&1; then
@@ -146,10 +154,12 @@ run_backend_tests() {
     fi
     
     if [ "$PARALLEL" = true ]; then
-        pytest_args="$pytest_args -n auto"
+        pytest_args="$pytest_args -n auto --dist=loadfile"
     fi
     
-    if [ "$SKIP_SLOW" = true ]; then
+    if [ "$SLOW_ONLY" = true ]; then
+        pytest_args="$pytest_args -m slow"
+    elif [ "$SKIP_SLOW" = true ]; then
         pytest_args="$pytest_args -m 'not slow'"
     fi
     